@@ -1,11 +1,13 @@
 import os
 from datetime import timedelta
-from pathlib import Path
 
-import openai
-from app.services import rag_service
-
-# from app.services.rag_service import process_reports
+from app.config import INDEX_PATH, INDEX_ROOT
+from app.services import (
+    colpali_index,
+    rag_service,
+    response_cache,
+)
+from app.services.openai_client import chat_completion
 from app.utils import auth
 from byaldi import RAGMultiModalModel
 from fastapi import (
@@ -24,27 +26,25 @@ from fastapi.responses import FileResponse, StreamingResponse
 frontend_router = APIRouter()
 api_router = APIRouter()
 
-# Set OpenAI API key from environment variable.
-openai.api_key = os.getenv('OPENAI_API_KEY')
 env = os.getenv('ENV', 'development')
 
-index_root = (
-    Path(__file__).resolve().parent.parent.parent.parent / 'data' / 'embeddings'
-)
-
 custom_pdf_model = RAGMultiModalModel.from_pretrained(
-    'vidore/colqwen2-v1.0', index_root=index_root
+    'vidore/colqwen2-v1.0', index_root=INDEX_ROOT, verbose=0
 )
 
-# Using this as a temporary fix to avoid re-indexing the reports when the server restarts.
-# This assumes that the reports are already indexed and stored in the data/embeddings directory.
-report_model = RAGMultiModalModel.from_index('reports', index_root=index_root)
-
-# report_model = RAGMultiModalModel.from_pretrained(
-#     'vidore/colqwen2-v1.0', index_root=index_root
-# )
+# The persisted reports index is reused across restarts unless the reports changed.
+report_model = rag_service.load_report_model()
+colpali_index.quantize_index(report_model)
 
-# process_reports(report_model)
+# The frontend configuration only depends on the environment, so it is rendered once.
+API_BASE = 'http://localhost:8000' if env == 'development' else ''
+CONFIG_JS_BYTES = f"""
+    window.APP_CONFIG = {{
+        ENV: "{env}",
+        API_BASE: "{API_BASE}"
+    }};
+    """.encode()
+CONFIG_JS_HEADERS = {'Cache-Control': 'public, max-age=3600'}
 
 
 @frontend_router.get('/config.js')
@@ -52,23 +52,20 @@ async def get_config():
     """
     Returns a JavaScript configuration file with API base URL and environment settings.
     """
-    env = os.environ.get('ENV', 'development')
-    config = {'API_BASE': 'http://localhost:8000' if env == 'development' else ''}
-    js_content = f"""
-    window.APP_CONFIG = {{
-        ENV: "{env}",
-        API_BASE: "{config['API_BASE']}"
-    }};
-    """
-    return Response(content=js_content, media_type='application/javascript')
+    return Response(
+        content=CONFIG_JS_BYTES,
+        media_type='application/javascript',
+        headers=CONFIG_JS_HEADERS,
+    )
 
 
 @frontend_router.get('/')
 async def read_index():
     """
-    Serves the main index.html file for the frontend.
+    Serves the main index.html file for the frontend. The response carries ETag and
+    Last-Modified headers, so browsers revalidate it instead of downloading it again.
     """
-    return FileResponse('../frontend/static/index.html')
+    return FileResponse(INDEX_PATH)
 
 
 @api_router.post('/login')
@@ -121,18 +118,33 @@ async def chat(
     if not messages:
         raise HTTPException(status_code=400, detail='No messages provided.')
 
-    response_stream = openai.chat.completions.create(
+    # Replay previously streamed answers for identical conversations from memory.
+    cache_key = response_cache.make_key('chat', messages)
+    cached_chunks = await response_cache.get_cached_response(cache_key)
+    if cached_chunks is not None:
+
+        async def replay_cached():
+            for chunk_message in cached_chunks:
+                yield chunk_message
+
+        return StreamingResponse(replay_cached(), media_type='text/plain')
+
+    response_stream = await chat_completion(
         model='gpt-4o-mini',
         messages=messages,
         temperature=0.7,
         stream=True,
     )
 
-    def stream_gpt():
-        for chunk in response_stream:
+    async def stream_gpt():
+        chunk_messages = []
+        async for chunk in response_stream:
             chunk_message = getattr(chunk.choices[0].delta, 'content', '')
             if chunk_message:
+                chunk_messages.append(chunk_message)
                 yield chunk_message
+        # Only fully streamed answers are cached.
+        await response_cache.cache_response(cache_key, tuple(chunk_messages))
 
     return StreamingResponse(stream_gpt(), media_type='text/plain')
 
@@ -143,12 +155,8 @@ async def upload_pdf(
 ):
     """
     Processes an uploaded PDF file and computes embeddings using the custom PDF model.
+    The model is loaded once at startup and only its index is rebuilt per upload.
     """
-    # Reinitialize the custom PDF model to re-index it with the newly uploaded PDF.
-    global custom_pdf_model
-    custom_pdf_model = RAGMultiModalModel.from_pretrained(
-        'vidore/colqwen2-v1.0', index_root=index_root
-    )
     result = await rag_service.process_pdf_upload(file, custom_pdf_model)
     return result
 
@@ -158,10 +166,10 @@ async def custom_pdf_query_endpoint(
     request: Request, user: str = Depends(auth.get_current_user_from_cookie)
 ):
     """
-    Retrieves relevant PDF chunks using the custom PDF model and returns an answer.
+    Retrieves relevant PDF chunks using the custom PDF model and streams the answer.
     """
-    result = await rag_service.query_rag(request, custom_pdf_model)
-    return result
+    frames = await rag_service.query_rag(request, custom_pdf_model, 'uploaded')
+    return StreamingResponse(frames, media_type='text/event-stream')
 
 
 @api_router.post('/report-query')
@@ -169,7 +177,7 @@ async def report_query_endpoint(
     request: Request, user: str = Depends(auth.get_current_user_from_cookie)
 ):
     """
-    Processes a report query using the report model via RAG.
+    Processes a report query using the report model via RAG and streams the answer.
     """
-    result = await rag_service.query_rag(request, report_model)
-    return result
+    frames = await rag_service.query_rag(request, report_model, 'reports')
+    return StreamingResponse(frames, media_type='text/event-stream')
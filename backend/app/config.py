@@ -2,6 +2,7 @@
 Configuration module for loading environment variables from a .env file.
 
 The .env file is selected based on the current ENV environment variable.
+Project paths are resolved once here and shared by the rest of the application.
 """
 
 import os
@@ -9,6 +10,18 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+DATA_DIR = PROJECT_ROOT / 'data'
+INDEX_ROOT = DATA_DIR / 'embeddings'
+UPLOADED_PATH = DATA_DIR / 'uploaded'
+REPORT_PATH = DATA_DIR / 'raw'
+LOG_DIR = DATA_DIR / 'log'
+# Uploaded PDFs are only read back for indexing, so they are staged in RAM when possible.
+SHM_DIR = Path('/dev/shm')
+UPLOAD_STAGING_PATH = SHM_DIR / 'rag_uploads' if SHM_DIR.is_dir() else UPLOADED_PATH
+FRONTEND_DIR = PROJECT_ROOT / 'frontend' / 'static'
+INDEX_PATH = FRONTEND_DIR / 'index.html'
+
 env = os.getenv('ENV', 'development')
-env_file = Path(__file__).resolve().parent.parent.parent / f'.env.{env}'
+env_file = PROJECT_ROOT / f'.env.{env}'
 load_dotenv(env_file)
@@ -5,18 +5,25 @@ This module sets up the FastAPI app, mounts static files,
 configures CORS middleware, and includes the API endpoints.
 """
 
+import asyncio
+import logging
 import os
 
 import app.config  # Import configuration settings.
 from app.api import endpoints
+from app.config import FRONTEND_DIR
+from app.services import rag_service, semantic_cache
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.staticfiles import StaticFiles
 
+# Debug output such as per-query traces is dropped unless the level is lowered.
+logging.basicConfig(level=logging.INFO)
+
 app = FastAPI()  # noqa: F811
 
 # Mount static files from the frontend directory.
-app.mount('/static', StaticFiles(directory='../frontend/static'), name='static')
+app.mount('/static', StaticFiles(directory=FRONTEND_DIR), name='static')
 
 # Determine the current environment.
 env = os.getenv('ENV', 'development')
@@ -37,3 +44,38 @@ app.add_middleware(
 # Include API routes.
 app.include_router(endpoints.frontend_router)
 app.include_router(endpoints.api_router, prefix='/api')
+
+
+@app.on_event('startup')
+async def use_eager_tasks():
+    """
+    Runs new tasks eagerly up to their first suspension point, saving an event loop
+    iteration for tasks that finish synchronously, such as cache hits. Requires
+    Python 3.12; older interpreters keep the default task factory.
+    """
+    if hasattr(asyncio, 'eager_task_factory'):
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+
+
+@app.on_event('startup')
+async def start_query_log_writer():
+    """
+    Starts the background writer for the query log.
+    """
+    rag_service.start_query_log_writer()
+
+
+@app.on_event('shutdown')
+async def stop_query_log_writer():
+    """
+    Flushes pending query log lines and stops the background writer.
+    """
+    await rag_service.stop_query_log_writer()
+
+
+@app.on_event('shutdown')
+def persist_semantic_caches():
+    """
+    Writes the semantic answer caches to disk so they survive restarts.
+    """
+    semantic_cache.save_caches()
@@ -0,0 +1,329 @@
+"""
+Helpers for managing byaldi ColQwen2 indexes without reloading the model weights.
+
+byaldi only loads an on-disk index as part of constructing a new model, which pulls the
+multi-GB ColQwen2 checkpoint again. These helpers operate on the in-memory index state
+of an already-initialized RAGMultiModalModel instead, and build indexes with batched
+forward passes rather than byaldi's page-by-page loop.
+"""
+
+import base64
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+import srsly  # type: ignore
+import torch
+from byaldi import RAGMultiModalModel
+from byaldi.objects import Result
+from pdf2image import convert_from_path
+from PIL import Image
+
+# Number of pages embedded per ColQwen2 forward pass, bounded by available VRAM.
+INDEX_BATCH_SIZE = 8
+# Number of pages scored per MaxSim batch when searching a quantized index.
+SEARCH_BATCH_SIZE = 128
+# Number of pdftoppm processes rendering the pages of a PDF in parallel.
+RENDER_THREAD_COUNT = os.cpu_count() or 1
+# Number of indexes cached by content hash. Each holds the page images of a whole PDF.
+INDEX_CACHE_MAX_ENTRIES = 16
+
+
+def load_index(model: RAGMultiModalModel, index_name: str) -> None:
+    """
+    Loads the on-disk index `index_name` into the given model, replacing whatever index
+    it currently holds. Mirrors the loading branch of byaldi's ColPaliModel constructor.
+    """
+    colpali = model.model
+    index_path = Path(colpali.index_root) / index_name
+    index_config = srsly.read_gzip_json(index_path / 'index_config.json.gz')
+
+    collection = {}
+    if index_config.get('full_document_collection', False):
+        collection_files = sorted(
+            (index_path / 'collection').glob('*.json.gz'),
+            key=lambda x: int(x.stem.split('.')[0]),
+        )
+        for collection_file in collection_files:
+            loaded_data = srsly.read_gzip_json(collection_file)
+            collection.update({int(k): v for k, v in loaded_data.items()})
+
+    embedding_files = sorted(
+        (index_path / 'embeddings').glob('embeddings_*.pt'),
+        key=lambda x: int(x.stem.split('_')[1]),
+    )
+    indexed_embeddings = []
+    for embedding_file in embedding_files:
+        indexed_embeddings.extend(torch.load(embedding_file))
+
+    embed_id_to_doc_id = {
+        int(k): v
+        for k, v in srsly.read_gzip_json(
+            index_path / 'embed_id_to_doc_id.json.gz'
+        ).items()
+    }
+    # Indexes created before byaldi 0.0.2 have no file name mapping.
+    file_names_path = index_path / 'doc_ids_to_file_names.json.gz'
+    doc_ids_to_file_names = (
+        {int(k): v for k, v in srsly.read_gzip_json(file_names_path).items()}
+        if file_names_path.exists()
+        else {}
+    )
+    metadata_path = index_path / 'metadata.json.gz'
+    doc_id_to_metadata = (
+        {int(k): v for k, v in srsly.read_gzip_json(metadata_path).items()}
+        if metadata_path.exists()
+        else {}
+    )
+
+    colpali.index_name = index_name
+    colpali.full_document_collection = index_config.get(
+        'full_document_collection', False
+    )
+    colpali.max_image_width = index_config.get('max_image_width')
+    colpali.max_image_height = index_config.get('max_image_height')
+    colpali.collection = collection
+    colpali.indexed_embeddings = indexed_embeddings
+    colpali.embed_id_to_doc_id = embed_id_to_doc_id
+    colpali.doc_ids = {int(entry['doc_id']) for entry in embed_id_to_doc_id.values()}
+    colpali.highest_doc_id = max(colpali.doc_ids, default=-1)
+    colpali.doc_ids_to_file_names = doc_ids_to_file_names
+    colpali.doc_id_to_metadata = doc_id_to_metadata
+    colpali.quantized_codes = None
+    colpali.quantized_scales = None
+
+
+def reset_index(model: RAGMultiModalModel) -> None:
+    """
+    Clears the in-memory index of the given model so that a new index can be built on the
+    same instance. byaldi's `index(..., overwrite=True)` only deletes the on-disk index
+    and would otherwise append the new pages to the previous ones.
+    """
+    colpali = model.model
+    colpali.index_name = None
+    colpali.collection = {}
+    colpali.indexed_embeddings = []
+    colpali.embed_id_to_doc_id = {}
+    colpali.doc_id_to_metadata = {}
+    colpali.doc_ids_to_file_names = {}
+    colpali.doc_ids = set()
+    colpali.highest_doc_id = -1
+    colpali.quantized_codes = None
+    colpali.quantized_scales = None
+
+
+def restore_cached_index(
+    model: RAGMultiModalModel, index_name: str, content_hash: str
+) -> bool:
+    """
+    Replaces the index `index_name` with the copy cached for `content_hash` and loads it
+    into the model. Returns False if no index has been cached for that content yet.
+    """
+    index_root = Path(model.model.index_root)
+    cached_index_path = index_root / 'cache' / content_hash
+    if not cached_index_path.exists():
+        return False
+
+    # The modification time of a cache entry records when it was last used.
+    os.utime(cached_index_path)
+    index_path = index_root / index_name
+    if index_path.exists():
+        shutil.rmtree(index_path)
+    shutil.copytree(cached_index_path, index_path)
+    load_index(model, index_name)
+    return True
+
+
+def cache_index(model: RAGMultiModalModel, index_name: str, content_hash: str) -> None:
+    """
+    Stores a copy of the on-disk index `index_name` under `content_hash`, so the same
+    content does not have to be embedded again, and prunes the least recently used
+    cached indexes beyond INDEX_CACHE_MAX_ENTRIES.
+    """
+    index_root = Path(model.model.index_root)
+    cached_index_path = index_root / 'cache' / content_hash
+    if cached_index_path.exists():
+        return
+
+    # Copy under a temporary name first so a crash never leaves a partial cache entry.
+    partial_path = cached_index_path.with_name(f'{content_hash}.partial')
+    if partial_path.exists():
+        shutil.rmtree(partial_path)
+    shutil.copytree(index_root / index_name, partial_path)
+    partial_path.rename(cached_index_path)
+    os.utime(cached_index_path)
+    prune_index_cache(cached_index_path.parent)
+
+
+def prune_index_cache(
+    cache_root: Path, max_entries: int = INDEX_CACHE_MAX_ENTRIES
+) -> None:
+    """
+    Removes the least recently used cached indexes beyond `max_entries`, ordered by
+    the modification time of their folders.
+    """
+    entries = sorted(
+        (
+            path
+            for path in cache_root.iterdir()
+            if path.is_dir() and path.suffix != '.partial'
+        ),
+        key=lambda path: path.stat().st_mtime,
+    )
+    for path in entries[: max(len(entries) - max_entries, 0)]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def embed_pages(model: RAGMultiModalModel, pages: list) -> list:
+    """
+    Embeds a batch of page images in a single ColQwen2 forward pass and returns one
+    multi-vector embedding per page, with the padding positions of the batch removed.
+    """
+    colpali = model.model
+    batch = colpali.processor.process_images(pages)
+    with torch.inference_mode():
+        batch = {
+            k: v.to(colpali.device).to(
+                colpali.model.dtype if v.is_floating_point() else v.dtype
+            )
+            for k, v in batch.items()
+        }
+        embeddings = colpali.model(**batch).cpu()
+
+    # Keeping only the unmasked positions gives each page exactly the vectors it would
+    # get when embedded on its own, as byaldi does.
+    attention_mask = batch['attention_mask'].bool().cpu()
+    return [embedding[mask] for embedding, mask in zip(embeddings, attention_mask)]
+
+
+def find_pdfs(directory: Path) -> list[Path]:
+    """
+    Returns the PDFs in the directory, recognized by a case-insensitive '.pdf' suffix,
+    sorted by path.
+    """
+    return sorted(p for p in directory.iterdir() if p.suffix.lower() == '.pdf')
+
+
+def batched_index(
+    model: RAGMultiModalModel,
+    input_path: Path,
+    index_name: str,
+    batch_size: int = INDEX_BATCH_SIZE,
+) -> None:
+    """
+    Builds a fresh index `index_name` from a PDF, or a directory of PDFs, by embedding the
+    pages in batches instead of byaldi's one-page-per-forward-pass loop. The index is
+    exported in byaldi's on-disk format, with the page images stored in the collection.
+    """
+    reset_index(model)
+    colpali = model.model
+    colpali.index_name = index_name
+    colpali.full_document_collection = True
+    colpali.max_image_width = None
+    colpali.max_image_height = None
+
+    index_path = Path(colpali.index_root) / index_name
+    if index_path.exists():
+        shutil.rmtree(index_path)
+
+    input_path = Path(input_path)
+    pdf_paths = find_pdfs(input_path) if input_path.is_dir() else [input_path]
+    for doc_id, pdf_path in enumerate(pdf_paths):
+        # Pages are rendered to disk and opened one batch at a time to bound memory use.
+        # Rendering is split into page ranges handled by parallel pdftoppm processes.
+        with tempfile.TemporaryDirectory() as output_folder:
+            page_paths = convert_from_path(
+                pdf_path,
+                output_folder=output_folder,
+                paths_only=True,
+                thread_count=RENDER_THREAD_COUNT,
+            )
+            for start in range(0, len(page_paths), batch_size):
+                pages = [
+                    Image.open(path) for path in page_paths[start : start + batch_size]
+                ]
+                for page_offset, (page, embedding) in enumerate(
+                    zip(pages, embed_pages(model, pages))
+                ):
+                    embed_id = len(colpali.indexed_embeddings)
+                    colpali.indexed_embeddings.append(embedding)
+                    colpali.embed_id_to_doc_id[embed_id] = {
+                        'doc_id': doc_id,
+                        'page_id': start + page_offset + 1,
+                    }
+                    buffered = BytesIO()
+                    page.save(buffered, format='PNG')
+                    colpali.collection[embed_id] = base64.b64encode(
+                        buffered.getvalue()
+                    ).decode()
+
+        colpali.doc_ids.add(doc_id)
+        colpali.doc_ids_to_file_names[doc_id] = str(pdf_path)
+        colpali.highest_doc_id = doc_id
+
+    colpali._export_index()
+
+
+def quantize_index(model: RAGMultiModalModel) -> None:
+    """
+    Replaces the in-memory page embeddings of the model with int8 codes and one float16
+    scale per vector, packed into padded tensors on the model's device. This halves the
+    resident memory of the index compared to the bfloat16 embeddings.
+    Once quantized, the index must be queried with search() from this module.
+    """
+    colpali = model.model
+    if not colpali.indexed_embeddings:
+        return
+
+    embeddings = torch.nn.utils.rnn.pad_sequence(
+        [embedding.float() for embedding in colpali.indexed_embeddings],
+        batch_first=True,
+    )
+    scales = embeddings.abs().amax(dim=-1).clamp(min=1e-8) / 127
+    codes = (embeddings / scales.unsqueeze(-1)).round().clamp(-127, 127)
+
+    colpali.quantized_codes = codes.to(torch.int8).to(colpali.device)
+    colpali.quantized_scales = scales.to(torch.float16).to(colpali.device)
+    colpali.indexed_embeddings = []
+
+
+def search(model: RAGMultiModalModel, query: str, k: int = 10) -> list:
+    """
+    Searches the index of the model for the query. Quantized indexes are scored with
+    late-interaction MaxSim on the int8 codes, rescaled per page vector; other indexes
+    fall back to byaldi's search.
+    """
+    colpali = model.model
+    if getattr(colpali, 'quantized_codes', None) is None:
+        return model.search(query, k=k)
+
+    # Codes are upcast one batch at a time to the model's dtype, which represents int8
+    # values exactly, instead of float32, which would read twice the bfloat16 bytes.
+    dtype = colpali.model.dtype
+    query_embedding = colpali.encode_query(query)[0].to(colpali.device, dtype)
+    batch_scores = []
+    for start in range(0, len(colpali.quantized_codes), SEARCH_BATCH_SIZE):
+        codes = colpali.quantized_codes[start : start + SEARCH_BATCH_SIZE].to(dtype)
+        scales = colpali.quantized_scales[start : start + SEARCH_BATCH_SIZE].to(dtype)
+        # Similarity of every query vector to every page vector, rescaled per page vector.
+        similarities = torch.einsum('qd,psd->pqs', query_embedding, codes)
+        similarities = similarities * scales.unsqueeze(1)
+        batch_scores.append(similarities.max(dim=2).values.float().sum(dim=1))
+    scores = torch.cat(batch_scores).cpu()
+
+    top_scores, top_embed_ids = scores.topk(min(k, len(scores)))
+    results = []
+    for score, embed_id in zip(top_scores.tolist(), top_embed_ids.tolist()):
+        doc_info = colpali.embed_id_to_doc_id[embed_id]
+        results.append(
+            Result(
+                doc_id=doc_info['doc_id'],
+                page_num=int(doc_info['page_id']),
+                score=score,
+                metadata=colpali.doc_id_to_metadata.get(int(doc_info['doc_id']), {}),
+                base64=colpali.collection.get(embed_id),
+            )
+        )
+    return results
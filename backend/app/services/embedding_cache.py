@@ -0,0 +1,73 @@
+"""
+Persistent cache for OpenAI text embeddings.
+
+Embeddings are stored in a SQLite table keyed by a SHA-256 hash of the embedding model
+name and the embedded text, so the same text is never sent to the embeddings API twice
+and vectors of different models never collide.
+"""
+
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# SQLite limits the number of host parameters in a single statement.
+MAX_KEYS_PER_QUERY = 500
+
+
+class EmbeddingCache:
+    """
+    Maps hashes of (model, text) pairs to float32 embedding vectors stored in SQLite.
+    The cache can be shared between threads.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings '
+            '(hash BLOB PRIMARY KEY, model TEXT, vec BLOB)'
+        )
+        self.connection.commit()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> bytes:
+        """
+        Returns the cache key of the text embedded with the given model.
+        """
+        return hashlib.sha256((model + '\0' + text).encode('utf-8')).digest()
+
+    def get_many(self, keys: list[bytes]) -> dict[bytes, np.ndarray]:
+        """
+        Returns the cached vectors of the given keys. Missing keys are left out.
+        """
+        vectors = {}
+        with self.lock:
+            for start in range(0, len(keys), MAX_KEYS_PER_QUERY):
+                batch = keys[start : start + MAX_KEYS_PER_QUERY]
+                rows = self.connection.execute(
+                    'SELECT hash, vec FROM embeddings WHERE hash IN '
+                    f"({', '.join('?' * len(batch))})",
+                    batch,
+                )
+                for key, vec in rows:
+                    vectors[key] = np.frombuffer(vec, dtype=np.float32)
+        return vectors
+
+    def put_many(self, entries: list[tuple[bytes, str, np.ndarray]]) -> None:
+        """
+        Stores (key, model, vector) entries in a single transaction.
+        """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO embeddings (hash, model, vec) VALUES (?, ?, ?)',
+                [
+                    (key, model, np.asarray(vec, dtype=np.float32).tobytes())
+                    for key, model, vec in entries
+                ],
+            )
@@ -0,0 +1,57 @@
+"""
+Shared asynchronous OpenAI client and completion helper.
+
+A single AsyncOpenAI instance is reused across the application so that HTTP
+connections are pooled and requests never block the event loop. Chat completions
+are retried with exponential backoff and jitter on rate limits and transient errors.
+"""
+
+import logging
+import os
+
+import openai
+from tenacity import (
+    before_sleep_log,
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+logger = logging.getLogger(__name__)
+
+client = openai.AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Returns True for OpenAI errors that are worth retrying: timeouts, connection
+    failures, rate limits and gateway errors.
+    """
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return (
+        isinstance(error, openai.APIStatusError)
+        and error.status_code in RETRYABLE_STATUS_CODES
+    )
+
+
+@retry(
+    wait=wait_random_exponential(min=1, max=30),
+    stop=stop_after_attempt(5),
+    retry=retry_if_exception(is_transient_error),
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    reraise=True,
+)
+async def _create_chat_completion(**kwargs):
+    return await client.chat.completions.create(**kwargs)
+
+
+async def chat_completion(**kwargs):
+    """
+    Creates a chat completion with the given OpenAI arguments, retrying transient errors.
+    Callers cache the answers they stream themselves.
+    """
+    return await _create_chat_completion(**kwargs)
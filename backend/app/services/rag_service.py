@@ -1,41 +1,241 @@
 import asyncio
 import datetime
+import hashlib
+import json
+import logging
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
 
 import aiofiles  # type: ignore
-import openai
+import tiktoken
+from app.config import (
+    INDEX_ROOT,
+    LOG_DIR,
+    REPORT_PATH,
+    UPLOAD_STAGING_PATH,
+    UPLOADED_PATH,
+)
+from app.services import (
+    colpali_index,
+    response_cache,
+    semantic_cache,
+)
+from app.services.openai_client import chat_completion
 from app.utils.helper_functions import (
     extract_keywords,
-    highlight_keywords_in_image,
+    highlight_keywords_in_images,
     remove_keywords,
 )
+from app.utils.locks import ReadWriteLock
+from byaldi import RAGMultiModalModel
+from cachetools import TTLCache
 from fastapi import HTTPException, Request
-from openai import APIError, APITimeoutError
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE = LOG_DIR / 'queries.log'
+# Content hashes of the reports the on-disk 'reports' index was built from.
+REPORT_MANIFEST_FILE = INDEX_ROOT / 'reports_manifest.json'
+UPLOAD_CHUNK_SIZE = 1 << 20
+RETRIEVAL_CACHE_MAXSIZE = 1024
+RETRIEVAL_CACHE_TTL_SECONDS = 600
+# Total length of the data URLs in the image part cache. The URLs are copies of page
+# images the index already holds, so the cache only keeps the most reused pages.
+IMAGE_PART_CACHE_MAX_BYTES = 64 << 20
+# Token budget for the previous conversation turns passed to the answer model.
+HISTORY_TOKEN_BUDGET = 2000
+# Rough token length of English text, used when the tokenizer is unavailable.
+FALLBACK_CHARS_PER_TOKEN = 4
+LOG_QUEUE_MAXSIZE = 10_000
+LOG_BATCH_SIZE = 64
+LOG_FLUSH_INTERVAL_SECONDS = 0.1
+
+UPLOADED_PATH.mkdir(parents=True, exist_ok=True)
+UPLOAD_STAGING_PATH.mkdir(parents=True, exist_ok=True)
+LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+_upload_lock = asyncio.Lock()
+
+# Searches run in worker threads alongside rebuilds of the same index, which replace the
+# index state of the model piece by piece, so they are serialized per index. Every
+# rebuild bumps the generation of the index, which is part of the key of everything
+# cached from its contents, so results of the previous index are never served again.
+_index_locks = {'uploaded': ReadWriteLock(), 'reports': ReadWriteLock()}
+_index_generations = {'uploaded': 0, 'reports': 0}
+# Index generation the answers in the semantic cache of each index were built from.
+_semantic_cache_generations = {'uploaded': 0, 'reports': 0}
+
+# Query log lines waiting to be appended to LOG_FILE by the background writer.
+_log_queue: asyncio.Queue = asyncio.Queue(maxsize=LOG_QUEUE_MAXSIZE)
+_log_writer_task: asyncio.Task | None = None
+# Second and formatted timestamp of the most recent log entry.
+_log_timestamp: tuple[int, str] = (-1, '')
+
+# Search results per (index name, index generation, k, normalized query hash).
+_retrieval_cache: TTLCache = TTLCache(
+    maxsize=RETRIEVAL_CACHE_MAXSIZE, ttl=RETRIEVAL_CACHE_TTL_SECONDS
+)
+# Image message parts per (index name, index generation, doc id, page number), least
+# recently used first, and the total length of their data URLs.
+_image_part_cache: OrderedDict[tuple[str, int, int, int], dict] = OrderedDict()
+_image_part_cache_bytes = 0
+
+
+def search_index(colpali_model, index_name: str, query: str, k: int) -> tuple:
+    """
+    Searches the index for the query while no rebuild of it is running, and returns
+    the results along with the generation of the index they were found in.
+    """
+    with _index_locks[index_name].read():
+        results = colpali_index.search(colpali_model, query, k=k)
+        return results, _index_generations[index_name]
+
+
+async def retrieve(colpali_model, index_name: str, query: str, k: int = 5) -> tuple:
+    """
+    Searches the index for the query, reusing the results of an identical query
+    (ignoring case and surrounding whitespace) made within the last ten minutes
+    against the same index generation. Returns the results and that generation.
+    """
+    digest = hashlib.sha1(query.strip().lower().encode('utf-8')).hexdigest()
+    generation = _index_generations[index_name]
+    results = _retrieval_cache.get((index_name, generation, k, digest))
+    if results is None:
+        results, generation = await asyncio.to_thread(
+            search_index, colpali_model, index_name, query, k
+        )
+        _retrieval_cache[(index_name, generation, k, digest)] = results
+    return results, generation
+
+
+def image_part(index_name: str, generation: int, result) -> dict:
+    """
+    Returns the chat message part holding the page image of a search result, found in
+    the given generation of the index, as a data URL. Parts of frequently retrieved
+    pages are cached, so neither their multi-megabyte URL strings nor the part dicts are
+    rebuilt per query. The parts are shared between requests and must not be modified.
+    """
+    global _image_part_cache_bytes
+
+    cache_key = (index_name, generation, result['doc_id'], result['page_num'])
+    part = _image_part_cache.get(cache_key)
+    if part is not None:
+        _image_part_cache.move_to_end(cache_key)
+        return part
+
+    url = f"data:image/png;base64,{result['base64']}"
+    part = {'type': 'image_url', 'image_url': {'url': url}}
+    _image_part_cache[cache_key] = part
+    _image_part_cache_bytes += len(url)
+    while _image_part_cache_bytes > IMAGE_PART_CACHE_MAX_BYTES:
+        evict_image_part(next(iter(_image_part_cache)))
+    return part
+
+
+def evict_image_part(cache_key: tuple[str, int, int, int]) -> None:
+    """
+    Removes an entry from the image part cache.
+    """
+    global _image_part_cache_bytes
+
+    part = _image_part_cache.pop(cache_key)
+    _image_part_cache_bytes -= len(part['image_url']['url'])
+
+
+def invalidate_retrieval_cache(index_name: str) -> None:
+    """
+    Drops the cached search results and page images of the given index after it has
+    been rebuilt.
+    """
+    for cache_key in [key for key in _retrieval_cache.keys() if key[0] == index_name]:
+        _retrieval_cache.pop(cache_key, None)
+    for cache_key in [key for key in _image_part_cache if key[0] == index_name]:
+        evict_image_part(cache_key)
+
+
+def index_uploaded_pdf(custom_pdf_model, file_path: Path, content_hash: str):
+    """
+    Builds the 'uploaded' index for the given PDF, reusing the cached embeddings of a
+    previously indexed PDF with identical content when available.
+    """
+    with _index_locks['uploaded'].write():
+        try:
+            if not colpali_index.restore_cached_index(
+                custom_pdf_model, 'uploaded', content_hash
+            ):
+                colpali_index.batched_index(custom_pdf_model, file_path, 'uploaded')
+                colpali_index.cache_index(custom_pdf_model, 'uploaded', content_hash)
+            colpali_index.quantize_index(custom_pdf_model)
+        finally:
+            # A failed rebuild has already replaced the previous index, so results
+            # cached under its generation must not be served either way.
+            _index_generations['uploaded'] += 1
 
 
 async def process_pdf_upload(file, custom_pdf_model):
     """
     Processes an uploaded PDF file by saving it locally, indexing it using the custom PDF model,
-    and computing embeddings.
+    and computing embeddings. PDFs whose content has been indexed before are restored from
+    the index cache instead of being embedded again.
     """
     if file.content_type != 'application/pdf':
         raise HTTPException(status_code=400, detail='Only PDF files are allowed.')
 
-    uploaded_path = (
-        Path(__file__).resolve().parent.parent.parent.parent / 'data' / 'uploaded'
-    )
-    uploaded_path.mkdir(parents=True, exist_ok=True)
-    file_path = uploaded_path / file.filename
-
-    with open(file_path, 'wb') as buffer:
-        buffer.write(await file.read())
-
-    custom_pdf_model.index(
-        input_path=file_path,
-        index_name='uploaded',
-        store_collection_with_index=True,
-        overwrite=True,
+    # Only the base name is used, so a crafted file name cannot escape the upload folder.
+    # Names without a base name of their own, such as '..', would refer to a folder.
+    file_name = Path(file.filename or '').name
+    if file_name in ('', '.', '..'):
+        raise HTTPException(status_code=400, detail='Invalid file name.')
+
+    # PDFs staged in RAM are removed once indexed, so each upload gets its own folder
+    # there; uploads kept on disk replace earlier ones with the same name.
+    staged_in_ram = UPLOAD_STAGING_PATH != UPLOADED_PATH
+    upload_dir = (
+        UPLOAD_STAGING_PATH / uuid.uuid4().hex if staged_in_ram else UPLOADED_PATH
     )
+    upload_dir.mkdir(exist_ok=True)
+
+    file_path = upload_dir / file_name
+
+    # Stream the upload to disk in chunks, hashing the content along the way. The file is
+    # written under a unique temporary name and moved into place once complete, so an
+    # aborted upload never leaves a truncated PDF behind.
+    partial_path = file_path.with_name(f'.{file_path.name}.{uuid.uuid4().hex}.partial')
+    content_hash = hashlib.sha256()
+    try:
+        async with aiofiles.open(partial_path, 'wb') as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                content_hash.update(chunk)
+                await buffer.write(chunk)
+        partial_path.replace(file_path)
+
+        # Indexing is GPU/CPU bound, so it runs off the event loop. Uploads are
+        # serialized because they all rebuild the index of the same shared model.
+        async with _upload_lock:
+            try:
+                await asyncio.to_thread(
+                    index_uploaded_pdf,
+                    custom_pdf_model,
+                    file_path,
+                    content_hash.hexdigest(),
+                )
+            finally:
+                # Answers cached for the previous upload no longer match the index,
+                # even when rebuilding it failed halfway.
+                invalidate_retrieval_cache('uploaded')
+                await response_cache.invalidate_namespace('uploaded')
+                reset_semantic_cache('uploaded')
+    except BaseException:
+        partial_path.unlink(missing_ok=True)
+        raise
+    finally:
+        # The index keeps the rendered pages, so the staged PDF is no longer needed.
+        if staged_in_ram:
+            shutil.rmtree(upload_dir, ignore_errors=True)
 
     return {
         'message': 'PDF uploaded and processed',
@@ -46,111 +246,274 @@ def process_reports(report_model):
     """
     Indexes reports from the raw data directory using the provided report model.
     """
-    report_path = Path(__file__).resolve().parent.parent.parent.parent / 'data' / 'raw'
-    report_model.index(
-        input_path=report_path,
-        index_name='reports',
-        store_collection_with_index=True,
-        overwrite=True,
+    with _index_locks['reports'].write():
+        try:
+            colpali_index.batched_index(report_model, REPORT_PATH, 'reports')
+        finally:
+            _index_generations['reports'] += 1
+            invalidate_retrieval_cache('reports')
+            reset_semantic_cache('reports')
+
+
+def reset_semantic_cache(index_name: str) -> None:
+    """
+    Clears the semantic cache of a rebuilt index and ties it to the new generation.
+    """
+    semantic_cache.get_cache(index_name).clear()
+    _semantic_cache_generations[index_name] = _index_generations[index_name]
+
+
+def hash_reports() -> dict:
+    """
+    Returns the SHA-256 content hash of every PDF in the raw data directory by file name.
+    The PDFs are found the same way the index is built from them.
+    """
+    report_hashes = {}
+    for report_file in colpali_index.find_pdfs(REPORT_PATH):
+        content_hash = hashlib.sha256()
+        with open(report_file, 'rb') as f:
+            while chunk := f.read(UPLOAD_CHUNK_SIZE):
+                content_hash.update(chunk)
+        report_hashes[report_file.name] = content_hash.hexdigest()
+    return report_hashes
+
+
+def load_report_model() -> RAGMultiModalModel:
+    """
+    Loads the report model from the persisted 'reports' index, re-indexing the reports
+    in the raw data directory only when they differ from the ones in the manifest of
+    the index. Without reports in the raw data directory, or without a manifest, the
+    persisted index is used as is: the directory may hold only some of the reports,
+    and re-indexing them would replace the index with a partial one.
+    """
+    index_exists = (INDEX_ROOT / 'reports' / 'index_config.json.gz').exists()
+    report_hashes = hash_reports() if REPORT_PATH.is_dir() else {}
+
+    if index_exists and (
+        not report_hashes
+        or not REPORT_MANIFEST_FILE.exists()
+        or json.loads(REPORT_MANIFEST_FILE.read_text()) == report_hashes
+    ):
+        return RAGMultiModalModel.from_index(
+            'reports', index_root=INDEX_ROOT, verbose=0
+        )
+
+    report_model = RAGMultiModalModel.from_pretrained(
+        'vidore/colqwen2-v1.0', index_root=INDEX_ROOT, verbose=0
     )
+    if not report_hashes:
+        logger.warning(
+            'No reports to index in %s, the reports index is empty.', REPORT_PATH
+        )
+        return report_model
+
+    logger.info('Reports changed since they were last indexed, re-indexing.')
+    process_reports(report_model)
+    REPORT_MANIFEST_FILE.write_text(json.dumps(report_hashes, indent=2))
+    return report_model
 
 
-async def log_query(query: str):
+def log_query(query: str):
     """
-    Asynchronously appends the query along with a timestamp to a log file.
-    The log file is stored in project/data/log/queries.log.
+    Queues the query along with a timestamp for the background writer, which appends it
+    to the log file stored in project/data/log/queries.log.
+    Entries are dropped rather than blocking the request when the queue is full.
     """
-    # Define the log directory and ensure it exists
-    log_dir = Path(__file__).resolve().parent.parent.parent.parent / 'data' / 'log'
-    log_dir.mkdir(parents=True, exist_ok=True)
-    log_file = log_dir / 'queries.log'
+    global _log_timestamp
+
+    # Timestamps have second precision, so the formatted UTC timestamp is reused for
+    # every entry logged within the same second.
+    second = int(time.time())
+    if second != _log_timestamp[0]:
+        _log_timestamp = (
+            second,
+            datetime.datetime.fromtimestamp(second, datetime.timezone.utc).isoformat(),
+        )
 
-    # Create a timezone-aware timestamp for the log entry
-    timestamp = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    try:
+        _log_queue.put_nowait(f'{_log_timestamp[1]}: {query}\n')
+    except asyncio.QueueFull:
+        logger.warning('Query log queue is full, dropping entry.')
 
-    # Write the log entry asynchronously
-    async with aiofiles.open(log_file, 'a') as f:
-        await f.write(f'{timestamp}: {query}\n')
+
+async def append_log_lines(lines: list[str]):
+    """
+    Appends a batch of log lines to the log file in a single write.
+    """
+    if lines:
+        async with aiofiles.open(LOG_FILE, 'a') as f:
+            await f.write(''.join(lines))
 
 
-async def query_rag(request: Request, colpali_model):
+async def write_query_log():
     """
-    Performs a Retrieval-Augmented Generation (RAG) query using the conversation history and the specified model.
-    Summarizes previous conversation context if available, searches for relevant document chunks,
-    and returns the answer along with document and page details.
+    Drains the query log queue, writing up to LOG_BATCH_SIZE lines at a time, or whatever
+    has been queued within LOG_FLUSH_INTERVAL_SECONDS of the first line of a batch.
+    """
+    while True:
+        lines = [await _log_queue.get()]
+        try:
+            # Wait for more lines to share the write, unless a full batch is ready.
+            if _log_queue.qsize() < LOG_BATCH_SIZE - 1:
+                await asyncio.sleep(LOG_FLUSH_INTERVAL_SECONDS)
+            while len(lines) < LOG_BATCH_SIZE and not _log_queue.empty():
+                lines.append(_log_queue.get_nowait())
+        finally:
+            # Lines already taken from the queue are written even when cancelled.
+            await append_log_lines(lines)
+
+
+def start_query_log_writer():
+    """
+    Starts the background task that writes queued query log lines to disk.
+    """
+    global _log_writer_task
+    _log_writer_task = asyncio.create_task(write_query_log())
+
+
+async def stop_query_log_writer():
+    """
+    Stops the background log writer and flushes any lines still in the queue.
+    """
+    if _log_writer_task is not None:
+        _log_writer_task.cancel()
+        try:
+            await _log_writer_task
+        except asyncio.CancelledError:
+            pass
+
+    lines = []
+    while not _log_queue.empty():
+        lines.append(_log_queue.get_nowait())
+    await append_log_lines(lines)
+
+
+def build_retrieval_query(messages: list) -> str:
+    """
+    Builds the query used for retrieval from the current (last) query and the user turn
+    before it, which resolves most follow-up references such as "and in 2022?" without
+    a rewrite call.
     """
-    data = await request.json()
-    messages = data.get('messages', [])
     current_query = messages[-1].get('content', '')
+    previous_queries = [
+        msg.get('content', '') for msg in messages[:-1] if msg.get('role') == 'user'
+    ]
+    if previous_queries:
+        return previous_queries[-1] + '\n' + current_query
+    return current_query
 
-    # Extract only the relevant context from the conversation history based on the current query.
-    if len(messages) > 1:
-        conversation_history = '\n'.join(
-            msg.get('content', '') for msg in messages[:-1]
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """
+    Returns the tokenizer of the gpt-4o model family, or None if it cannot be loaded.
+    tiktoken downloads the encoding on first use unless it is found in the directory
+    set by TIKTOKEN_CACHE_DIR, which the Docker image populates at build time.
+    """
+    try:
+        return tiktoken.get_encoding('o200k_base')
+    except Exception:
+        logger.warning(
+            'Could not load the o200k_base tokenizer, estimating token counts.',
+            exc_info=True,
         )
+        return None
 
-        context_extraction_prompt = f"""
-            Please read the conversation context below along with the current user query.
-            From the conversation, identify and extract only the details that are directly relevant or necessary for answering the current query.
-            Do not summarize the entire chat history; instead, focus on providing only the essential context needed to address the user’s question accurately.
-            If certain parts of the conversation are unrelated, do not include them in your response.
-            The extracted context should be a very concise summary of the relevant information.
-            if the conversation history is not relevant to the current query, don't output anything. Don't say things like "No relevant context is available." or similar.
 
-            Conversation Context:
-            {conversation_history}
+def count_tokens(text: str) -> int:
+    """
+    Returns the number of gpt-4o tokens in the text, or an estimate based on its length
+    if the tokenizer is unavailable. Special-token markup is counted as plain text.
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // FALLBACK_CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
 
-            Current Query:
-            {current_query}
-            """
 
-        retry_delay = 0.5
-        while True:
-            try:
-                context_extraction_response = openai.chat.completions.create(
-                    model='gpt-4o-mini',
-                    messages=[
-                        {'role': 'system', 'content': 'You are a query rewriter...'},
-                        {'role': 'user', 'content': context_extraction_prompt},
-                    ],
-                    temperature=0.1,
-                )
-                relevant_context = context_extraction_response.choices[
-                    0
-                ].message.content.strip()
-                break
-            except APITimeoutError as e:
-                asyncio.create_task(
-                    log_query(
-                        f'Context injection timeout: {e}. Retrying in {retry_delay}s'
-                    )
-                )
-                await asyncio.sleep(retry_delay)
-            except APIError as e:
-                if e.status_code in {502, 503, 504, 429}:
-                    asyncio.create_task(
-                        log_query(
-                            f'Context injection error ({e.status_code}): {e}. Retrying in {retry_delay}s'
-                        )
-                    )
-                    await asyncio.sleep(retry_delay)
-                else:
-                    raise
-            except Exception as e:
-                asyncio.create_task(
-                    log_query(f'Unexpected context injection error: {e}')
-                )
-                raise
-    else:
-        relevant_context = ''
+def trim_history(messages: list, token_budget: int = HISTORY_TOKEN_BUDGET) -> list:
+    """
+    Returns the conversation turns preceding the current query as chat messages, keeping
+    the most recent turns that fit within the token budget.
+    """
+    history = []
+    for msg in reversed(messages[:-1]):
+        content = msg.get('content', '')
+        if msg.get('role') not in ('user', 'assistant') or not content:
+            continue
+        token_budget -= count_tokens(content)
+        if token_budget < 0:
+            break
+        history.append({'role': msg['role'], 'content': content})
+    history.reverse()
+    return history
+
+
+def format_sse(payload: dict) -> str:
+    """
+    Formats a payload as a single Server-Sent Events data frame.
+    """
+    return f'data: {json.dumps(payload)}\n\n'
 
-    # Combine the extracted relevant context with the current query.
-    query = (
-        relevant_context + '\n' + current_query if relevant_context else current_query
-    )
-    asyncio.create_task(log_query(query))
 
-    results = colpali_model.search(query, k=5)
+async def stream_cached_result(result: dict):
+    """
+    Streams a previously computed answer as a single terminating SSE frame.
+    """
+    yield format_sse({'type': 'done', **result})
+
+
+async def query_rag(request: Request, colpali_model, index_name: str):
+    """
+    Performs a Retrieval-Augmented Generation (RAG) query using the conversation history and the specified model.
+    Searches for relevant document chunks and answers with the conversation history passed to the model,
+    and returns an async iterator of SSE frames: answer tokens as they are generated, followed by
+    a terminating 'done' frame carrying the cleaned answer and the highlighted images.
+    Identical conversations against the same index are answered from the response cache.
+    """
+    data = await request.json()
+    messages = data.get('messages', [])
+    current_query = messages[-1].get('content', '')
+
+    # Everything cached below belongs to the index generation the query started on.
+    generation = _index_generations[index_name]
+    cache_key = response_cache.make_key(f'{index_name}:{generation}', messages)
+    cached_result = await response_cache.get_cached_response(cache_key)
+    if cached_result is not None:
+        return stream_cached_result(cached_result)
+
+    # The answering model disambiguates the question using the history itself, so
+    # retrieval only needs a cheap approximation of the rewritten query.
+    query = build_retrieval_query(messages)
+    logger.debug('RAG query on %s: %s', index_name, query)
+    log_query(query)
+
+    # Paraphrases of previously answered queries skip retrieval and generation. The
+    # semantic cache is only used while it holds answers of the same index generation.
+    query_cache = semantic_cache.get_cache(index_name)
+    query_embedding = None
+    retrieval = None
+    if _semantic_cache_generations[index_name] == generation:
+        query_embedding = await semantic_cache.cached_query_embedding(query)
+        if query_embedding is None:
+            # Embedding the query needs an API call, which overlaps with retrieval; on a
+            # semantic hit the retrieved pages are only kept in the retrieval cache.
+            query_embedding, retrieval = await asyncio.gather(
+                semantic_cache.embed_query(query),
+                retrieve(colpali_model, index_name, query, k=5),
+            )
+    # The semantic cache is skipped when the query could not be embedded.
+    use_semantic_cache = query_embedding is not None
+    if use_semantic_cache:
+        cached_result = query_cache.lookup(query_embedding)
+        if cached_result is not None:
+            await response_cache.cache_response(cache_key, cached_result)
+            return stream_cached_result(cached_result)
+
+    if retrieval is None:
+        retrieval = await retrieve(colpali_model, index_name, query, k=5)
+    results, retrieved_generation = retrieval
+
     result_images = [result['base64'] for result in results]
 
     system_prompt = """You are an assistant that strictly answers questions based on information visibly present in the provided images of company business reports. Follow these rules:
@@ -181,68 +544,70 @@ async def query_rag(request: Request, colpali_model):
                     Q: What's our market share in Asia?
                     A: I couldn't find the relevant information in the provided report."""
 
+    # Previous turns are passed as regular chat messages, so the model resolves follow-up
+    # questions against them itself.
     messages_payload = [
         {
             'role': 'system',
             'content': system_prompt,
         },
+        *trim_history(messages),
         {
             'role': 'user',
             'content': [
-                {'type': 'text', 'text': query},
-                *map(
-                    lambda x: {
-                        'type': 'image_url',
-                        'image_url': {'url': f'data:image/png;base64,{x}'},
-                    },
-                    result_images,
-                ),
+                {'type': 'text', 'text': current_query},
+                *[
+                    image_part(index_name, retrieved_generation, result)
+                    for result in results
+                ],
             ],
         },
     ]
 
-    while True:
-        try:
-            completion = openai.chat.completions.create(
-                model='gpt-4o', messages=messages_payload, temperature=0.2
-            )
-            answer = completion.choices[0].message.content
-            break
-        except APITimeoutError as e:
-            asyncio.create_task(
-                log_query(f'Completion timeout: {e}. Retrying in {retry_delay}s')
-            )
-            await asyncio.sleep(retry_delay)
-        except APIError as e:
-            if e.status_code in {502, 503, 504, 429}:
-                asyncio.create_task(
-                    log_query(
-                        f'Completion error ({e.status_code}): {e}. Retrying in {retry_delay}s'
-                    )
-                )
-                await asyncio.sleep(retry_delay)
-            else:
-                raise
-        except Exception as e:
-            asyncio.create_task(log_query(f'Unexpected completion error: {e}'))
-            raise
-
-    asyncio.create_task(log_query(answer))
-
-    keywords = extract_keywords(answer)
-    answer = remove_keywords(answer)
-
-    if keywords:
-        num_images_to_highlight = 2
-        highlighted_images = [
-            highlight_keywords_in_image(result_images[i], keywords)
-            for i in range(min(num_images_to_highlight, len(result_images)))
-        ]
-    else:
-        highlighted_images = []
-        print('No keywords found in the answer.')
+    response_stream = await chat_completion(
+        model='gpt-4o', messages=messages_payload, temperature=0.2, stream=True
+    )
 
-    return {
-        'answer': answer,
-        'highlighted_images': highlighted_images,
-    }
+    async def stream_answer():
+        answer_chunks = []
+        async for chunk in response_stream:
+            if not chunk.choices:
+                continue
+            chunk_message = getattr(chunk.choices[0].delta, 'content', '')
+            if chunk_message:
+                answer_chunks.append(chunk_message)
+                yield format_sse({'type': 'token', 'content': chunk_message})
+
+        answer = ''.join(answer_chunks)
+        log_query(answer)
+
+        keywords = extract_keywords(answer)
+        answer = remove_keywords(answer)
+
+        if keywords:
+            # OCR and re-encoding are CPU bound, so they run off the event loop. The
+            # images share a single Tesseract run.
+            num_images_to_highlight = 2
+            highlighted_images = await asyncio.to_thread(
+                highlight_keywords_in_images,
+                result_images[:num_images_to_highlight],
+                keywords,
+            )
+        else:
+            highlighted_images = []
+            logger.debug('No keywords found in the answer.')
+
+        result = {
+            'answer': answer,
+            'highlighted_images': list(highlighted_images),
+        }
+        # Answers from an index that has been rebuilt in the meantime are not cached.
+        if retrieved_generation == generation == _index_generations[index_name]:
+            await response_cache.cache_response(cache_key, result)
+            if use_semantic_cache and (
+                _semantic_cache_generations[index_name] == generation
+            ):
+                query_cache.add(query_embedding, result)
+        yield format_sse({'type': 'done', **result})
+
+    return stream_answer()
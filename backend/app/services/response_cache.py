@@ -0,0 +1,78 @@
+"""
+Exact-match response cache for chat and RAG answers.
+
+Responses are keyed by a SHA-256 hash of the JSON-serialized messages payload,
+namespaced by the index (or endpoint) that produced them, and expire after a fixed TTL.
+"""
+
+import asyncio
+import hashlib
+import json
+
+from cachetools import TTLCache
+
+# RAG answers carry base64-encoded page images of up to a few MB each, so the cache is
+# bounded by the size of its responses rather than by their number.
+CACHE_MAX_BYTES = 256 << 20
+CACHE_TTL_SECONDS = 3600
+
+
+def response_size(response) -> int:
+    """
+    Approximates the size of a response in bytes by the length of the strings it holds,
+    which dominate both chat chunks and RAG answers with their page images.
+    """
+    if isinstance(response, (str, bytes)):
+        return len(response)
+    if isinstance(response, dict):
+        return sum(response_size(value) for value in response.values())
+    if isinstance(response, (list, tuple)):
+        return sum(response_size(item) for item in response)
+    # Numbers, None and other small values.
+    return 8
+
+
+_cache: TTLCache = TTLCache(
+    maxsize=CACHE_MAX_BYTES, ttl=CACHE_TTL_SECONDS, getsizeof=response_size
+)
+_lock = asyncio.Lock()
+
+
+def make_key(namespace: str, messages: list) -> str:
+    """
+    Builds a cache key from the namespace and a SHA-256 hash of the messages payload.
+    Keys are serialized with sorted keys so that equivalent payloads hash identically.
+    """
+    payload = json.dumps(messages, sort_keys=True, ensure_ascii=False)
+    digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    return f'{namespace}:{digest}'
+
+
+async def get_cached_response(key: str):
+    """
+    Returns the cached response for the given key, or None if it is missing or expired.
+    """
+    async with _lock:
+        return _cache.get(key)
+
+
+async def cache_response(key: str, response) -> None:
+    """
+    Stores a response under the given key, evicting the least recently used responses
+    as needed. Responses larger than the whole cache are not stored.
+    """
+    if response_size(response) > CACHE_MAX_BYTES:
+        return
+    async with _lock:
+        _cache[key] = response
+
+
+async def invalidate_namespace(namespace: str) -> None:
+    """
+    Drops every cached response belonging to the given namespace, e.g. after
+    the underlying index has been rebuilt.
+    """
+    prefix = f'{namespace}:'
+    async with _lock:
+        for key in [key for key in _cache.keys() if key.startswith(prefix)]:
+            _cache.pop(key, None)
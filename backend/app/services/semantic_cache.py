@@ -0,0 +1,285 @@
+"""
+Semantic cache for RAG answers.
+
+Queries are embedded with OpenAI's text-embedding-3-small model and compared by cosine
+similarity against previously answered queries, so paraphrased repeats can be answered
+without running retrieval or generation again. Query embeddings are persisted, so exact
+repeats do not call the embeddings API either.
+"""
+
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+import faiss  # type: ignore
+import numpy as np
+import openai
+from app.config import INDEX_ROOT
+from app.services.embedding_cache import EmbeddingCache
+from app.services.openai_client import client
+from app.services.response_cache import response_size
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = 'text-embedding-3-small'
+EMBEDDING_DIM = 1536
+CACHE_CAPACITY = 1024
+# Answers carry base64-encoded page images of up to a few MB each, so the payloads of
+# each cache are bounded in size as well as in number.
+CACHE_MAX_BYTES = 128 << 20
+SIMILARITY_THRESHOLD = 0.95
+# The cache only saves work, so a slow embeddings API must not hold up the query long.
+EMBEDDING_TIMEOUT_SECONDS = 10
+# Approximate int8 matches re-scored against the stored float16 embeddings.
+RERANK_CANDIDATES = 8
+# Embeddings are L2-normalized before storage, where float16 keeps cosine similarities
+# accurate to about 1e-3, well below the margin of SIMILARITY_THRESHOLD.
+STORAGE_DTYPE = np.float16
+
+# Caches are stored per embedding model, as embeddings of different models are not
+# comparable with each other.
+CACHE_DIR = INDEX_ROOT / 'semantic_cache' / EMBEDDING_MODEL
+EMBEDDING_CACHE_FILE = INDEX_ROOT / 'semantic_cache' / 'embeddings.sqlite3'
+# Only caches of indexes that are restored at startup are persisted. The uploaded PDF
+# is gone after a restart, so answers cached for it would no longer match.
+PERSISTED_CACHES = ('reports',)
+
+
+def as_query_matrix(embedding: np.ndarray) -> np.ndarray:
+    """
+    Returns the embedding as the contiguous (1, dim) float32 matrix FAISS expects,
+    without copying it when it already is one.
+    """
+    return np.ascontiguousarray(embedding, dtype=np.float32).reshape(1, -1)
+
+
+def as_ids(*entry_ids: int) -> np.ndarray:
+    """
+    Returns entry ids as the int64 array FAISS expects.
+    """
+    return np.array(entry_ids, dtype=np.int64)
+
+
+def new_index(dim: int) -> faiss.Index:
+    """
+    Creates an empty exact inner-product index addressed by entry id, so evicted entries
+    are removed in place. At the cache capacity an exhaustive scan takes microseconds,
+    which a graph index cannot beat, and a graph would have to be rebuilt on eviction.
+    Vectors are stored as 8-bit codes over [-1, 1], the value range of L2-normalized
+    embeddings, so the index needs no training on the cached data and scans a quarter
+    of the bytes of float32 vectors.
+    """
+    index = faiss.IndexScalarQuantizer(
+        dim, faiss.ScalarQuantizer.QT_8bit_uniform, faiss.METRIC_INNER_PRODUCT
+    )
+    index.train(np.stack([-np.ones(dim), np.ones(dim)]).astype(np.float32))
+    return faiss.IndexIDMap(index)
+
+
+class SemanticCache:
+    """
+    Holds L2-normalized query embeddings in a quantized FAISS inner-product index,
+    so that inner product equals cosine similarity, alongside float16 copies of the
+    embeddings and the cached answer payloads. Candidates from the index are re-scored
+    against the float16 copies, which take half the memory of float32 ones.
+    Holds at most `capacity` entries with payloads of at most `max_bytes` in total,
+    and evicts the least recently used entries beyond that.
+    """
+
+    def __init__(
+        self,
+        dim: int = EMBEDDING_DIM,
+        capacity: int = CACHE_CAPACITY,
+        threshold: float = SIMILARITY_THRESHOLD,
+        max_bytes: int = CACHE_MAX_BYTES,
+    ):
+        self.dim = dim
+        self.capacity = capacity
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self.index = new_index(dim)
+        # Entry id -> (embedding, payload), ordered from least to most recently used.
+        # Entries are stored in the FAISS index under the same id.
+        self.entries: OrderedDict[int, tuple[np.ndarray, dict]] = OrderedDict()
+        self.next_id = 0
+        self.payload_bytes = 0
+
+    def rebuild_index(self) -> None:
+        """
+        Rebuilds the FAISS index from the current entries.
+        """
+        self.index = new_index(self.dim)
+        if self.entries:
+            # A single add of one contiguous (N, dim) block instead of N small adds.
+            self.index.add_with_ids(
+                np.stack([vec for vec, _ in self.entries.values()]).astype(np.float32),
+                as_ids(*self.entries),
+            )
+
+    def lookup(self, embedding: np.ndarray) -> dict | None:
+        """
+        Returns the payload of the most similar cached query if its cosine similarity
+        reaches the threshold, otherwise None. Hits count as a use for LRU eviction.
+        """
+        if self.index.ntotal == 0:
+            return None
+        query = as_query_matrix(embedding)
+        _, ids = self.index.search(query, RERANK_CANDIDATES)
+        # FAISS reports an id of -1 for every missing candidate.
+        candidate_ids = [int(i) for i in ids[0] if i >= 0]
+        if not candidate_ids:
+            return None
+        # Candidates are upcast once, so the product runs in float32 BLAS.
+        candidates = np.stack([self.entries[i][0] for i in candidate_ids])
+        scores = candidates.astype(np.float32) @ query[0]
+        best = int(scores.argmax())
+        if scores[best] < self.threshold:
+            return None
+        entry_id = candidate_ids[best]
+        self.entries.move_to_end(entry_id)
+        return self.entries[entry_id][1]
+
+    def add(self, embedding: np.ndarray, payload: dict) -> None:
+        """
+        Stores the payload for the given query embedding, evicting the least recently
+        used entries when the cache is full. Payloads larger than the whole cache are
+        not stored.
+        """
+        size = response_size(payload)
+        if size > self.max_bytes:
+            return
+        entry_id = self.next_id
+        self.next_id += 1
+        self.entries[entry_id] = (embedding.astype(STORAGE_DTYPE), payload)
+        self.payload_bytes += size
+        self.index.add_with_ids(as_query_matrix(embedding), as_ids(entry_id))
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries until the cache is within its capacity
+        and its payload size budget.
+        """
+        evicted_ids = []
+        while len(self.entries) > self.capacity or self.payload_bytes > self.max_bytes:
+            evicted_id, (_, payload) = self.entries.popitem(last=False)
+            self.payload_bytes -= response_size(payload)
+            evicted_ids.append(evicted_id)
+        if evicted_ids:
+            self.index.remove_ids(as_ids(*evicted_ids))
+
+    def clear(self) -> None:
+        """
+        Removes every cached entry.
+        """
+        self.index = new_index(self.dim)
+        self.entries.clear()
+        self.payload_bytes = 0
+
+    def save(self, path: Path) -> None:
+        """
+        Writes the embeddings and the payloads next to each other on disk, in LRU order.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        embeddings = [vec for vec, _ in self.entries.values()]
+        np.save(
+            path.with_suffix('.npy'),
+            np.stack(embeddings)
+            if embeddings
+            else np.empty((0, self.dim), STORAGE_DTYPE),
+        )
+        path.with_suffix('.json').write_text(
+            json.dumps([payload for _, payload in self.entries.values()])
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> 'SemanticCache':
+        """
+        Restores a cache previously written with save(), or returns an empty cache
+        if nothing has been persisted at the given path.
+        """
+        cache = cls()
+        embedding_file = path.with_suffix('.npy')
+        payload_file = path.with_suffix('.json')
+        if embedding_file.exists() and payload_file.exists():
+            # Caches written before embeddings were stored as float16 are converted.
+            embeddings = np.load(embedding_file).astype(STORAGE_DTYPE, copy=False)
+            payloads = json.loads(payload_file.read_text())
+            entries = list(zip(embeddings, payloads))[-cache.capacity :]
+            cache.entries.update(enumerate(entries))
+            cache.next_id = len(entries)
+            cache.payload_bytes = sum(response_size(payload) for _, payload in entries)
+            cache.evict()
+            cache.rebuild_index()
+        return cache
+
+
+# One cache per index, as the same query has different answers per document set.
+_caches: dict[str, SemanticCache] = {}
+
+
+def get_cache(index_name: str) -> SemanticCache:
+    """
+    Returns the semantic cache for the given index, loading persisted caches from disk
+    on first use.
+    """
+    if index_name not in _caches:
+        _caches[index_name] = (
+            SemanticCache.load(CACHE_DIR / index_name)
+            if index_name in PERSISTED_CACHES
+            else SemanticCache()
+        )
+    return _caches[index_name]
+
+
+@lru_cache(maxsize=1)
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    Returns the persistent query embedding cache, opening it on first use.
+    """
+    return EmbeddingCache(EMBEDDING_CACHE_FILE)
+
+
+def save_caches() -> None:
+    """
+    Persists every semantic cache in PERSISTED_CACHES that has been used since startup.
+    """
+    for index_name, cache in _caches.items():
+        if index_name in PERSISTED_CACHES:
+            cache.save(CACHE_DIR / index_name)
+
+
+async def cached_query_embedding(query: str) -> np.ndarray | None:
+    """
+    Returns the stored embedding of a previously embedded identical query, or None.
+    """
+    key = EmbeddingCache.make_key(EMBEDDING_MODEL, query)
+    cached = await asyncio.to_thread(get_embedding_cache().get_many, [key])
+    return cached.get(key)
+
+
+async def embed_query(query: str) -> np.ndarray | None:
+    """
+    Embeds the query with the embeddings API, stores the embedding for later calls of
+    cached_query_embedding() and returns it as an L2-normalized float32 vector. Returns
+    None if the API fails, so that the query skips the semantic cache instead of failing.
+    """
+    key = EmbeddingCache.make_key(EMBEDDING_MODEL, query)
+    try:
+        response = await client.embeddings.create(
+            model=EMBEDDING_MODEL, input=[query], timeout=EMBEDDING_TIMEOUT_SECONDS
+        )
+    except openai.OpenAIError:
+        logger.warning(
+            'Embedding the query failed, skipping the semantic cache.', exc_info=True
+        )
+        return None
+    embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
+    embedding /= np.linalg.norm(embedding)
+    await asyncio.to_thread(
+        get_embedding_cache().put_many, [(key, EMBEDDING_MODEL, embedding)]
+    )
+    return embedding
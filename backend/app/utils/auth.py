@@ -5,9 +5,14 @@ access token creation, and retrieving the current user from cookies.
 It uses JSON Web Tokens (JWT) for authentication and Passlib for password hashing.
 """
 
+import hashlib
 import os
+import threading
+import time
 from datetime import datetime, timedelta
+from functools import lru_cache
 
+from cachetools import TTLCache
 from fastapi import (
     HTTPException,
     Request,
@@ -24,6 +29,11 @@ SECRET_KEY = os.environ.get('SECRET_KEY', 'DEV_ONLY_KEY')
 ALGORITHM = 'HS256'
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+PASSWORD_CACHE_MAXSIZE = 128
+PASSWORD_CACHE_TTL_SECONDS = 60
+TOKEN_CACHE_MAXSIZE = 4096
+TOKEN_CACHE_BUCKET_SECONDS = 30
+
 ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME')
 ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD')
 
@@ -35,6 +45,13 @@ if not ADMIN_USERNAME or not ADMIN_PASSWORD:
 # Create a hashed version of the admin password.
 hashed_admin_password = pwd_context.hash(ADMIN_PASSWORD)
 
+# Recent bcrypt verification outcomes. Sync endpoints run in a thread pool, so access
+# to the cache is serialized by a lock.
+_password_cache: TTLCache = TTLCache(
+    maxsize=PASSWORD_CACHE_MAXSIZE, ttl=PASSWORD_CACHE_TTL_SECONDS
+)
+_password_cache_lock = threading.Lock()
+
 # In-memory user database for the admin.
 FAKE_USER_DB = {
     ADMIN_USERNAME: {
@@ -48,6 +65,10 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify that the provided plain password matches the hashed password.
 
+    Outcomes are cached for PASSWORD_CACHE_TTL_SECONDS, so repeated checks of the same
+    credentials skip bcrypt. The cache is keyed by a digest of the plain password keyed
+    with SECRET_KEY, so no plaintext is retained.
+
     Args:
         plain_password (str): The plain text password.
         hashed_password (str): The hashed password to compare against.
@@ -55,7 +76,17 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         bool: True if the password is valid, False otherwise.
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    digest = hashlib.blake2b(
+        plain_password.encode(), digest_size=16, key=SECRET_KEY.encode()[:64]
+    ).digest()
+    cache_key = (digest, hashed_password)
+    with _password_cache_lock:
+        is_valid = _password_cache.get(cache_key)
+    if is_valid is None:
+        is_valid = pwd_context.verify(plain_password, hashed_password)
+        with _password_cache_lock:
+            _password_cache[cache_key] = is_valid
+    return is_valid
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
@@ -80,6 +111,25 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     return encoded_jwt
 
 
+@lru_cache(maxsize=TOKEN_CACHE_MAXSIZE)
+def _decode_token(token: str, bucket: int) -> tuple[str | None, int | None]:
+    """
+    Decode and verify a JWT, memoized per token and time bucket.
+
+    Args:
+        token (str): The encoded JWT.
+        bucket (int): Time window the decoded claims are cached for.
+
+    Raises:
+        JWTError: If the token is invalid or expired. Failures are not cached.
+
+    Returns:
+        tuple[str | None, int | None]: The 'sub' and 'exp' claims of the token.
+    """
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    return payload.get('sub'), payload.get('exp')
+
+
 def get_current_user_from_cookie(request: Request) -> str:
     """
     Retrieve the current user's username from the access token stored in cookies.
@@ -99,8 +149,14 @@ def get_current_user_from_cookie(request: Request) -> str:
             status_code=status.HTTP_401_UNAUTHORIZED, detail='Not authenticated'
         )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get('sub')
+        username, expires_at = _decode_token(
+            token, int(time.time()) // TOKEN_CACHE_BUCKET_SECONDS
+        )
+        # Cached claims may outlive the token, so expiry is checked on every request.
+        if expires_at is not None and expires_at <= time.time():
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid JWT token'
+            )
         if username is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid JWT payload'
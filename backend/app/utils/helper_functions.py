@@ -1,10 +1,30 @@
 import base64
+import bisect
+import hashlib
 import re
+import threading
+from collections import OrderedDict
 from io import BytesIO
 
+import ahocorasick
+import numpy as np
 import pytesseract
+from numba import njit
 from PIL import Image, ImageDraw
 
+# Patterns for the '**Keywords:**' section that ends every RAG answer.
+_KW_HEADER = re.compile(r'\*\*keywords:\*\*\s*(.+)', re.IGNORECASE)
+_KW_QUOTED = re.compile(r"'([^']+)'")
+_KW_SPLIT = re.compile(r'\*\*keywords:\*\*', re.IGNORECASE)
+
+# OCR results of recently highlighted pages, least recently used first. Highlighting
+# runs in worker threads, so access to the cache is serialized by a lock.
+OCR_CACHE_MAXSIZE = 64
+# Blank pixels between images stacked for a single OCR run.
+OCR_STACK_GAP = 32
+_ocr_cache: OrderedDict[bytes, dict] = OrderedDict()
+_ocr_cache_lock = threading.Lock()
+
 
 def extract_keywords(answer: str):
     """
@@ -16,11 +36,11 @@ def extract_keywords(answer: str):
         input: "**Keywords:** 'Equals', 'CAP', '$35,636,692','$9,288,633'"
         output: ['Equals', 'CAP', '$35,636,692', '$9,288,633']
     """
-    match = re.search(r'(?i)\*\*keywords:\*\*\s*(.+)', answer)
+    match = _KW_HEADER.search(answer)
     if match:
         keywords_text = match.group(1)
         # Extract content within single quotes
-        return re.findall(r"'([^']+)'", keywords_text)
+        return _KW_QUOTED.findall(keywords_text)
     return []
 
 
@@ -34,48 +54,192 @@ def remove_keywords(answer: str) -> str:
         output: "This is the main text."
     """
     # Split the text at the '**Keywords:**' marker (case-insensitive) and return the part before it.
-    parts = re.split(r'(?i)\*\*keywords:\*\*', answer, maxsplit=1)
+    parts = _KW_SPLIT.split(answer, maxsplit=1)
     return parts[0].strip()
 
 
+def build_keyword_automaton(keywords: list):
+    """
+    Builds an Aho-Corasick automaton over the keywords, normalized by removing spaces and
+    lowercasing, so a word can be checked against all keywords in a single pass.
+    Returns None if no keyword is left after normalization.
+    """
+    automaton = ahocorasick.Automaton()
+    for keyword in keywords:
+        normalized_keyword = keyword.replace(' ', '').lower()
+        if normalized_keyword:
+            automaton.add_word(normalized_keyword, keyword)
+    if len(automaton) == 0:
+        return None
+    automaton.make_automaton()
+    return automaton
+
+
+def ocr_images(images: list, cache_keys: list) -> list:
+    """
+    Returns the word-level OCR data of each image, reusing cached results where possible.
+    Images missing from the OCR cache are stacked vertically and recognized with a single
+    Tesseract run, as starting Tesseract dominates the cost of OCR on a few pages. The
+    recognized words are then mapped back to their image by their vertical offset.
+    """
+    with _ocr_cache_lock:
+        results = [_ocr_cache.get(cache_key) for cache_key in cache_keys]
+        for cache_key, cached in zip(cache_keys, results):
+            if cached is not None:
+                _ocr_cache.move_to_end(cache_key)
+
+    missing = [i for i, cached in enumerate(results) if cached is None]
+    if not missing:
+        return results
+
+    # Stack the images top to bottom on a white canvas, separated by a blank gap so
+    # that Tesseract never joins lines of adjacent images.
+    offsets = []
+    height = 0
+    for i in missing:
+        offsets.append(height)
+        height += images[i].height + OCR_STACK_GAP
+    stacked = Image.new('RGB', (max(images[i].width for i in missing), height), 'white')
+    for i, offset in zip(missing, offsets):
+        stacked.paste(images[i], (0, offset))
+
+    data = pytesseract.image_to_data(stacked, output_type=pytesseract.Output.DICT)
+
+    per_image: dict[int, dict[str, list]] = {
+        i: {'text': [], 'left': [], 'top': [], 'width': [], 'height': []}
+        for i in missing
+    }
+    for j in range(len(data['text'])):
+        top = data['top'][j]
+        position = bisect.bisect_right(offsets, top) - 1
+        i = missing[position]
+        if top >= offsets[position] + images[i].height:
+            continue
+        image_data = per_image[i]
+        image_data['text'].append(data['text'][j])
+        image_data['left'].append(data['left'][j])
+        image_data['top'].append(top - offsets[position])
+        image_data['width'].append(data['width'][j])
+        image_data['height'].append(data['height'][j])
+
+    with _ocr_cache_lock:
+        for i in missing:
+            results[i] = per_image[i]
+            _ocr_cache[cache_keys[i]] = per_image[i]
+            if len(_ocr_cache) > OCR_CACHE_MAXSIZE:
+                _ocr_cache.popitem(last=False)
+    return results
+
+
+@njit(cache=True)
+def merge_highlight_boxes(
+    lefts, tops, widths, heights, matches, image_width, image_height
+):
+    """
+    Returns the (n, 4) int32 [x0, y0, x1, y1] rectangles to highlight for the matched
+    OCR words, clipped to the image bounds. Tesseract lists the words of a line in
+    reading order, so consecutive matched words that overlap vertically are merged into
+    one rectangle, which highlights multi-word keywords without gaps or double shading.
+    """
+    rects = np.empty((lefts.shape[0], 4), dtype=np.int32)
+    count = 0
+    previous = -2
+    for i in range(lefts.shape[0]):
+        if not matches[i]:
+            continue
+        x0 = max(lefts[i], 0)
+        y0 = max(tops[i], 0)
+        x1 = min(lefts[i] + widths[i], image_width - 1)
+        y1 = min(tops[i] + heights[i], image_height - 1)
+        if x0 > x1 or y0 > y1:
+            continue
+        if (
+            previous == i - 1
+            and y0 <= rects[count - 1, 3]
+            and rects[count - 1, 1] <= y1
+        ):
+            rects[count - 1, 0] = min(rects[count - 1, 0], x0)
+            rects[count - 1, 1] = min(rects[count - 1, 1], y0)
+            rects[count - 1, 2] = max(rects[count - 1, 2], x1)
+            rects[count - 1, 3] = max(rects[count - 1, 3], y1)
+        else:
+            rects[count, 0] = x0
+            rects[count, 1] = y0
+            rects[count, 2] = x1
+            rects[count, 3] = y1
+            count += 1
+        previous = i
+    return rects[:count]
+
+
 def highlight_keywords_in_image(image_b64: str, keywords: list) -> str:
     """
     Accepts an image in base64 format and a list of keywords. Performs OCR on the image using Tesseract,
     highlights the bounding boxes for any words that match the keywords (even if they include punctuation or extra spaces),
-    and returns the highlighted image as a base64-encoded PNG.
+    and returns the highlighted image as a base64-encoded JPEG. Images without any match are returned unchanged.
     """
-    # If the base64 string has a data URL header, remove it.
-    if image_b64.startswith('data:image'):
-        image_b64 = image_b64.split(',')[1]
-
-    # Decode the base64 string and open the image.
-    image_data = base64.b64decode(image_b64)
-    img = Image.open(BytesIO(image_data)).convert('RGB')
-
-    # Create a drawing context with support for transparency.
-    draw = ImageDraw.Draw(img, 'RGBA')
-
-    # Perform OCR to get word-level bounding boxes.
-    data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
-
-    # Iterate over each detected word.
-    for i in range(len(data['text'])):
-        text = data['text'][i].strip()
-        # Normalize by removing spaces before comparing.
-        if any(
-            keyword.replace(' ', '').lower() in text.replace(' ', '').lower()
-            for keyword in keywords
-        ):
-            left = data['left'][i]
-            top = data['top'][i]
-            width = data['width'][i]
-            height = data['height'][i]
-            rect = [left, top, left + width, top + height]
-            # Draw a semi-transparent yellow rectangle over the matched word.
+    return highlight_keywords_in_images([image_b64], keywords)[0]
+
+
+def highlight_keywords_in_images(images_b64: list, keywords: list) -> list:
+    """
+    Highlights the keywords in several base64 images like highlight_keywords_in_image,
+    running OCR for all of them at once.
+    """
+    # If a base64 string has a data URL header, remove it.
+    images_b64 = [
+        image_b64.split(',')[1] if image_b64.startswith('data:image') else image_b64
+        for image_b64 in images_b64
+    ]
+
+    # Decode the base64 strings and open the images.
+    images = [
+        Image.open(BytesIO(base64.b64decode(image_b64))).convert('RGB')
+        for image_b64 in images_b64
+    ]
+
+    # Perform OCR to get word-level bounding boxes. The same page is often retrieved for
+    # several queries, so results are cached by a hash of the encoded image.
+    cache_keys = [
+        hashlib.blake2b(image_b64.encode(), digest_size=16).digest()
+        for image_b64 in images_b64
+    ]
+    ocr_results = ocr_images(images, cache_keys)
+
+    automaton = build_keyword_automaton(keywords)
+
+    highlighted_images = []
+    for image_b64, img, data in zip(images_b64, images, ocr_results):
+        # Match each detected word, normalized by removing spaces, against the keywords.
+        matches = np.zeros(len(data['text']), dtype=np.bool_)
+        if automaton is not None:
+            for i, text in enumerate(data['text']):
+                normalized_text = text.replace(' ', '').lower()
+                matches[i] = next(automaton.iter(normalized_text), None) is not None
+
+        # Without any highlight the original encoding can be returned as is.
+        if not matches.any():
+            highlighted_images.append(image_b64)
+            continue
+
+        rects = merge_highlight_boxes(
+            np.asarray(data['left'], dtype=np.int32),
+            np.asarray(data['top'], dtype=np.int32),
+            np.asarray(data['width'], dtype=np.int32),
+            np.asarray(data['height'], dtype=np.int32),
+            matches,
+            img.width,
+            img.height,
+        )
+
+        # Draw a semi-transparent yellow rectangle over every matched run of words.
+        draw = ImageDraw.Draw(img, 'RGBA')
+        for rect in rects.tolist():
             draw.rectangle(rect, fill=(255, 255, 0, 128))
 
-    # Save the modified image to a bytes buffer and encode it back to base64.
-    buffered = BytesIO()
-    img.save(buffered, format='PNG')
-    highlighted_b64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
-    return highlighted_b64
+        # Save the modified image to a bytes buffer and encode it back to base64. JPEG
+        # encodes several times faster than PNG and is good enough for a highlighted page.
+        buffered = BytesIO()
+        img.save(buffered, format='JPEG', quality=85)
+        highlighted_images.append(base64.b64encode(buffered.getvalue()).decode('utf-8'))
+    return highlighted_images
@@ -0,0 +1,59 @@
+"""
+Synchronization primitives shared between worker threads.
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Lets any number of readers hold the lock at once, while a writer holds it alone.
+    Waiting writers take precedence over new readers, so a steady stream of readers
+    cannot starve a writer. The lock is held by threads, not asyncio tasks, so work
+    running in a worker thread stays protected even if the awaiting task is cancelled.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writers_waiting = 0
+        self._writing = False
+
+    @contextmanager
+    def read(self):
+        """
+        Holds the lock shared with other readers for the duration of the block.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: not self._writing and not self._writers_waiting
+            )
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        """
+        Holds the lock exclusively for the duration of the block.
+        """
+        with self._condition:
+            self._writers_waiting += 1
+            try:
+                self._condition.wait_for(
+                    lambda: not self._writing and not self._readers
+                )
+            finally:
+                self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
@@ -0,0 +1,50 @@
+"""
+Shared test setup. The OpenAI client is created at import time and refuses to start
+without an API key, so a dummy key is set before any application module is imported.
+Tests never reach the API; they replace the client calls they exercise. The auth module
+likewise requires admin credentials at import time.
+Tesseract is replaced the same way, by the `tesseract` fixture.
+"""
+
+import os
+
+import pytest
+
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+os.environ.setdefault('ADMIN_USERNAME', 'admin')
+os.environ.setdefault('ADMIN_PASSWORD', 'admin-password')
+
+
+class FakeTesseract:
+    """
+    Returns canned image_to_data output and records the size of every OCR'd image.
+    """
+
+    def __init__(self):
+        self.output = self.data()
+        self.sizes = []
+
+    @staticmethod
+    def data(*words) -> dict:
+        """
+        Builds image_to_data output from (text, left, top, width, height) words.
+        """
+        keys = ('text', 'left', 'top', 'width', 'height')
+        return {key: [word[i] for word in words] for i, key in enumerate(keys)}
+
+    def image_to_data(self, image, output_type=None):
+        self.sizes.append(image.size)
+        return self.output
+
+
+@pytest.fixture
+def tesseract(monkeypatch):
+    from app.utils import helper_functions
+
+    fake = FakeTesseract()
+    monkeypatch.setattr(
+        helper_functions.pytesseract, 'image_to_data', fake.image_to_data
+    )
+    helper_functions._ocr_cache.clear()
+    yield fake
+    helper_functions._ocr_cache.clear()
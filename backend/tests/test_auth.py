@@ -0,0 +1,75 @@
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from app.utils import auth
+from fastapi import HTTPException
+
+
+@pytest.fixture
+def bcrypt_calls(monkeypatch):
+    """
+    Counts the bcrypt verifications that reach Passlib.
+    """
+    calls = []
+    verify = auth.pwd_context.verify
+
+    def counting_verify(plain_password, hashed_password):
+        calls.append(plain_password)
+        return verify(plain_password, hashed_password)
+
+    monkeypatch.setattr(auth.pwd_context, 'verify', counting_verify)
+    auth._password_cache.clear()
+    yield calls
+    auth._password_cache.clear()
+
+
+def test_verify_password_caches_the_outcome(bcrypt_calls):
+    password, hashed = auth.ADMIN_PASSWORD, auth.hashed_admin_password
+
+    assert auth.verify_password(password, hashed)
+    assert auth.verify_password(password, hashed)
+    assert not auth.verify_password('wrong-password', hashed)
+    assert not auth.verify_password('wrong-password', hashed)
+
+    assert bcrypt_calls == [password, 'wrong-password']
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Controls the time seen by the expiry check. Decoded tokens stay cached for the
+    whole test, as every time falls into the same cache bucket.
+    """
+    now = SimpleNamespace(time=time.time())
+    monkeypatch.setattr(auth.time, 'time', lambda: now.time)
+    monkeypatch.setattr(auth, 'TOKEN_CACHE_BUCKET_SECONDS', 10**9)
+    auth._decode_token.cache_clear()
+    yield now
+    auth._decode_token.cache_clear()
+
+
+def request_with_token(token: str) -> SimpleNamespace:
+    return SimpleNamespace(cookies={'access_token': token})
+
+
+def test_cached_token_is_rejected_once_expired(clock):
+    request = request_with_token(
+        auth.create_access_token({'sub': 'admin'}, timedelta(minutes=5))
+    )
+    assert auth.get_current_user_from_cookie(request) == 'admin'
+    assert auth.get_current_user_from_cookie(request) == 'admin'
+
+    clock.time += 10 * 60
+    with pytest.raises(HTTPException) as excinfo:
+        auth.get_current_user_from_cookie(request)
+
+    assert excinfo.value.status_code == 401
+    assert auth._decode_token.cache_info().misses == 1
+
+
+def test_invalid_token_is_rejected(clock):
+    with pytest.raises(HTTPException) as excinfo:
+        auth.get_current_user_from_cookie(request_with_token('not-a-jwt'))
+    assert excinfo.value.status_code == 401
@@ -0,0 +1,36 @@
+import base64
+from io import BytesIO
+
+import pytest
+from app.utils.helper_functions import highlight_keywords_in_images
+from PIL import Image
+
+
+def encode_image(width: int, height: int, color='white') -> str:
+    buffered = BytesIO()
+    Image.new('RGB', (width, height), color).save(buffered, format='PNG')
+    return base64.b64encode(buffered.getvalue()).decode()
+
+
+def test_highlight_returns_images_without_matches_unchanged(tesseract):
+    image_b64 = encode_image(40, 20)
+    tesseract.output = tesseract.data(('Revenue', 1, 1, 10, 5))
+
+    assert highlight_keywords_in_images([image_b64], ['CEO']) == [image_b64]
+
+
+def test_highlight_marks_matched_words(tesseract):
+    image_b64 = encode_image(40, 20)
+    tesseract.output = tesseract.data(
+        ('Revenue', 1, 1, 10, 5), ('$1,321,368.', 20, 1, 10, 5)
+    )
+
+    (highlighted,) = highlight_keywords_in_images(
+        [f'data:image/png;base64,{image_b64}'], ['$1,321,368']
+    )
+
+    image = Image.open(BytesIO(base64.b64decode(highlighted)))
+    assert image.format == 'JPEG'
+    red, green, blue = image.getpixel((25, 3))
+    assert red > 200 and green > 200 and blue < 160
+    assert image.getpixel((5, 3)) == pytest.approx((255, 255, 255), abs=8)
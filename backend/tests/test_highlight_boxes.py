@@ -0,0 +1,54 @@
+import numpy as np
+from app.utils.helper_functions import merge_highlight_boxes
+
+
+def boxes(*words) -> tuple:
+    """
+    Packs (left, top, width, height, matched) words into merge_highlight_boxes arrays.
+    """
+    columns = np.array([word[:4] for word in words], dtype=np.int32).T
+    matches = np.array([word[4] for word in words], dtype=np.bool_)
+    return (*columns, matches)
+
+
+def test_merge_highlight_boxes_merges_consecutive_words_on_a_line():
+    rects = merge_highlight_boxes(
+        *boxes((10, 5, 15, 10, True), (30, 6, 20, 10, True)), 100, 50
+    )
+    assert rects.tolist() == [[10, 5, 50, 16]]
+
+
+def test_merge_highlight_boxes_keeps_words_separated_by_a_miss_apart():
+    rects = merge_highlight_boxes(
+        *boxes((10, 5, 15, 10, True), (30, 5, 10, 10, False), (45, 5, 10, 10, True)),
+        100,
+        50,
+    )
+    assert rects.tolist() == [[10, 5, 25, 15], [45, 5, 55, 15]]
+
+
+def test_merge_highlight_boxes_keeps_consecutive_lines_apart():
+    # The last word of a line is followed by the first word of the next line.
+    rects = merge_highlight_boxes(
+        *boxes((60, 5, 30, 10, True), (10, 20, 30, 10, True)), 100, 50
+    )
+    assert rects.tolist() == [[60, 5, 90, 15], [10, 20, 40, 30]]
+
+
+def test_merge_highlight_boxes_clips_to_the_image():
+    rects = merge_highlight_boxes(
+        *boxes(
+            (-5, -2, 20, 10, True),
+            (90, 45, 20, 10, False),
+            (90, 45, 20, 10, True),
+            (200, 5, 10, 10, True),
+        ),
+        100,
+        50,
+    )
+    assert rects.tolist() == [[0, 0, 15, 8], [90, 45, 99, 49]]
+
+
+def test_merge_highlight_boxes_without_matches():
+    rects = merge_highlight_boxes(*boxes((10, 5, 15, 10, False)), 100, 50)
+    assert rects.shape == (0, 4)
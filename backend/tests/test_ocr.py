@@ -0,0 +1,35 @@
+from app.utils.helper_functions import OCR_STACK_GAP, ocr_images
+from PIL import Image
+
+
+def test_ocr_images_maps_words_back_across_the_stacking_gap(tesseract):
+    images = [Image.new('RGB', (40, 100)), Image.new('RGB', (30, 50))]
+    second_offset = 100 + OCR_STACK_GAP
+    tesseract.output = tesseract.data(
+        ('CAP', 1, 5, 5, 4),
+        # Noise recognized in the blank gap between the images is dropped.
+        ('gap', 1, 100 + OCR_STACK_GAP // 2, 5, 4),
+        ('$35,636,692', 2, second_offset + 3, 5, 4),
+    )
+
+    first, second = ocr_images(images, [b'first', b'second'])
+
+    assert tesseract.sizes == [(40, 100 + 50 + 2 * OCR_STACK_GAP)]
+    assert first == tesseract.data(('CAP', 1, 5, 5, 4))
+    assert second == tesseract.data(('$35,636,692', 2, 3, 5, 4))
+
+
+def test_ocr_images_only_recognizes_uncached_images(tesseract):
+    images = [Image.new('RGB', (40, 100)), Image.new('RGB', (30, 50))]
+    tesseract.output = tesseract.data(('CAP', 1, 5, 5, 4))
+    cached = ocr_images(images[:1], [b'first'])
+
+    tesseract.output = tesseract.data(('Equals', 2, 3, 5, 4))
+    first, second = ocr_images(images, [b'first', b'second'])
+
+    assert first == cached[0]
+    assert second == tesseract.data(('Equals', 2, 3, 5, 4))
+    assert tesseract.sizes == [(40, 100 + OCR_STACK_GAP), (30, 50 + OCR_STACK_GAP)]
+
+    assert ocr_images(images, [b'first', b'second']) == [first, second]
+    assert len(tesseract.sizes) == 2
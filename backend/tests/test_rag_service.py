@@ -0,0 +1,27 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from app.services import rag_service
+from fastapi import HTTPException
+
+
+@pytest.mark.parametrize('file_name', ['..', 'a/../..', '.', ''])
+def test_upload_without_a_usable_file_name_is_rejected(
+    tmp_path, monkeypatch, file_name
+):
+    monkeypatch.setattr(rag_service, 'UPLOADED_PATH', tmp_path)
+    monkeypatch.setattr(rag_service, 'UPLOAD_STAGING_PATH', tmp_path)
+
+    async def read(size=-1):
+        return b''
+
+    file = SimpleNamespace(
+        content_type='application/pdf', filename=file_name, read=read
+    )
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(rag_service.process_pdf_upload(file, custom_pdf_model=None))
+
+    assert excinfo.value.status_code == 400
+    assert not any(tmp_path.iterdir())
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+from app.services import response_cache
+from cachetools import TTLCache
+
+
+@pytest.fixture
+def small_cache(monkeypatch):
+    monkeypatch.setattr(response_cache, 'CACHE_MAX_BYTES', 100)
+    cache = TTLCache(maxsize=100, ttl=60, getsizeof=response_cache.response_size)
+    monkeypatch.setattr(response_cache, '_cache', cache)
+    return cache
+
+
+def rag_answer(image_bytes: int) -> dict:
+    return {'answer': 'abcd', 'highlighted_images': ['x' * image_bytes]}
+
+
+def test_response_size_counts_the_strings_of_a_response():
+    assert response_cache.response_size(rag_answer(40)) == 44
+    assert response_cache.response_size(('ab', 'cde')) == 5
+
+
+def test_cache_evicts_least_recently_used_responses_beyond_the_byte_budget(
+    small_cache,
+):
+    async def scenario():
+        await response_cache.cache_response('a', rag_answer(40))
+        await response_cache.cache_response('b', rag_answer(40))
+        await response_cache.get_cached_response('a')
+        await response_cache.cache_response('c', rag_answer(40))
+        return [await response_cache.get_cached_response(key) for key in 'abc']
+
+    a, b, c = asyncio.run(scenario())
+
+    assert a == rag_answer(40) and c == rag_answer(40)
+    assert b is None
+    assert small_cache.currsize == 88
+
+
+def test_cache_skips_responses_larger_than_the_budget(small_cache):
+    async def scenario():
+        await response_cache.cache_response('a', rag_answer(40))
+        await response_cache.cache_response('big', rag_answer(200))
+        return [await response_cache.get_cached_response(key) for key in ('a', 'big')]
+
+    assert asyncio.run(scenario()) == [rag_answer(40), None]
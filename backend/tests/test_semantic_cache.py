@@ -0,0 +1,220 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import numpy as np
+import openai
+import pytest
+from app.services import semantic_cache
+from app.services.embedding_cache import EmbeddingCache
+from app.services.semantic_cache import SemanticCache
+
+DIM = 64
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+def unit_vector(rng, dim: int = DIM) -> np.ndarray:
+    vector = rng.standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def cache_class(capacity: int) -> type[SemanticCache]:
+    # SemanticCache.load() creates the cache with the default arguments of the class.
+    class TestCache(SemanticCache):
+        def __init__(self):
+            super().__init__(dim=DIM, capacity=capacity)
+
+    return TestCache
+
+
+def payloads(cache: SemanticCache) -> list:
+    return [payload for _, payload in cache.entries.values()]
+
+
+def test_lookup_on_empty_cache_returns_none(rng):
+    cache = SemanticCache(dim=DIM)
+    assert cache.lookup(unit_vector(rng)) is None
+
+
+def test_lookup_returns_payload_of_similar_query(rng):
+    cache = SemanticCache(dim=DIM)
+    query = unit_vector(rng)
+    cache.add(query, {'answer': 'a'})
+
+    paraphrase = query + 0.01 * unit_vector(rng)
+    paraphrase /= np.linalg.norm(paraphrase)
+    assert cache.lookup(paraphrase) == {'answer': 'a'}
+    assert cache.lookup(unit_vector(rng)) is None
+
+
+def test_lookup_with_fewer_entries_than_candidates(rng):
+    # FAISS pads the candidates beyond the cached entries with id -1.
+    cache = SemanticCache(dim=DIM)
+    queries = [unit_vector(rng) for _ in range(semantic_cache.RERANK_CANDIDATES // 2)]
+    for i, query in enumerate(queries):
+        cache.add(query, {'answer': i})
+
+    for i, query in enumerate(queries):
+        assert cache.lookup(query) == {'answer': i}
+
+
+def test_add_evicts_least_recently_used_entry(rng):
+    cache = SemanticCache(dim=DIM, capacity=3)
+    a, b, c, d = (unit_vector(rng) for _ in range(4))
+    cache.add(a, {'answer': 'a'})
+    cache.add(b, {'answer': 'b'})
+    cache.add(c, {'answer': 'c'})
+    # A hit counts as a use, so 'b' becomes the least recently used entry.
+    assert cache.lookup(a) == {'answer': 'a'}
+
+    cache.add(d, {'answer': 'd'})
+
+    assert cache.index.ntotal == 3
+    assert payloads(cache) == [{'answer': 'c'}, {'answer': 'a'}, {'answer': 'd'}]
+    assert cache.lookup(b) is None
+    assert cache.lookup(c) == {'answer': 'c'}
+    assert cache.lookup(d) == {'answer': 'd'}
+
+
+def test_add_evicts_least_recently_used_entries_beyond_the_byte_budget(rng):
+    cache = SemanticCache(dim=DIM, max_bytes=100)
+    a, b, c = (unit_vector(rng) for _ in range(3))
+    cache.add(a, {'answer': 'a' * 40})
+    cache.add(b, {'answer': 'b' * 40})
+    # Payloads larger than the whole cache are not stored.
+    cache.add(c, {'answer': 'c' * 101})
+    assert cache.lookup(c) is None
+
+    cache.add(c, {'answer': 'c' * 40})
+
+    assert payloads(cache) == [{'answer': 'b' * 40}, {'answer': 'c' * 40}]
+    assert cache.payload_bytes == 80
+    assert cache.index.ntotal == 2
+    assert cache.lookup(a) is None
+
+
+def test_clear_removes_every_entry(rng):
+    cache = SemanticCache(dim=DIM)
+    query = unit_vector(rng)
+    cache.add(query, {'answer': 'a'})
+
+    cache.clear()
+
+    assert cache.index.ntotal == 0
+    assert not cache.entries
+    assert cache.lookup(query) is None
+
+
+def test_save_and_load_round_trip(tmp_path, rng):
+    cache = cache_class(capacity=3)()
+    queries = [unit_vector(rng) for _ in range(4)]
+    for i, query in enumerate(queries):
+        cache.add(query, {'answer': i})
+    cache.save(tmp_path / 'uploaded')
+
+    loaded = cache_class(capacity=3).load(tmp_path / 'uploaded')
+
+    assert payloads(loaded) == payloads(cache)
+    for (loaded_vec, _), (vec, _) in zip(
+        loaded.entries.values(), cache.entries.values()
+    ):
+        np.testing.assert_array_equal(loaded_vec, vec)
+    assert loaded.lookup(queries[0]) is None
+    assert loaded.lookup(queries[3]) == {'answer': 3}
+
+    # Entries added after loading must not reuse the ids of loaded entries.
+    new_query = unit_vector(rng)
+    loaded.add(new_query, {'answer': 'new'})
+    assert loaded.lookup(new_query) == {'answer': 'new'}
+    assert loaded.lookup(queries[2]) == {'answer': 2}
+
+
+def test_load_keeps_the_most_recent_entries_up_to_capacity(tmp_path, rng):
+    cache = SemanticCache(dim=DIM)
+    for i in range(5):
+        cache.add(unit_vector(rng), {'answer': i})
+    cache.save(tmp_path / 'reports')
+
+    loaded = cache_class(capacity=2).load(tmp_path / 'reports')
+
+    assert payloads(loaded) == [{'answer': 3}, {'answer': 4}]
+    assert loaded.index.ntotal == 2
+
+
+def test_load_keeps_the_most_recent_entries_within_the_byte_budget(tmp_path, rng):
+    cache = SemanticCache(dim=DIM)
+    for i in range(3):
+        cache.add(unit_vector(rng), {'answer': str(i) * 40})
+    cache.save(tmp_path / 'reports')
+
+    class SmallCache(SemanticCache):
+        def __init__(self):
+            super().__init__(dim=DIM, max_bytes=100)
+
+    loaded = SmallCache.load(tmp_path / 'reports')
+
+    assert payloads(loaded) == [{'answer': '1' * 40}, {'answer': '2' * 40}]
+    assert loaded.payload_bytes == 80
+    assert loaded.index.ntotal == 2
+
+
+def test_load_without_saved_cache_returns_empty_cache(tmp_path):
+    cache = cache_class(capacity=2).load(tmp_path / 'missing')
+    assert not cache.entries
+    assert cache.index.ntotal == 0
+
+
+def test_only_caches_of_restored_indexes_are_persisted(tmp_path, monkeypatch, rng):
+    monkeypatch.setattr(semantic_cache, 'CACHE_DIR', tmp_path)
+    monkeypatch.setattr(semantic_cache, 'SemanticCache', cache_class(capacity=2))
+    monkeypatch.setattr(semantic_cache, '_caches', {})
+    for index_name in ('reports', 'uploaded'):
+        semantic_cache.get_cache(index_name).add(unit_vector(rng), {'answer': 'a'})
+
+    semantic_cache.save_caches()
+    monkeypatch.setattr(semantic_cache, '_caches', {})
+
+    assert payloads(semantic_cache.get_cache('reports')) == [{'answer': 'a'}]
+    assert not semantic_cache.get_cache('uploaded').entries
+    assert not (tmp_path / 'uploaded.json').exists()
+
+
+@pytest.fixture
+def embedding_cache(tmp_path, monkeypatch):
+    cache = EmbeddingCache(tmp_path / 'embeddings.sqlite3')
+    monkeypatch.setattr(semantic_cache, 'get_embedding_cache', lambda: cache)
+    return cache
+
+
+def test_embed_query_normalizes_and_stores_embedding(embedding_cache, monkeypatch):
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[3.0, 4.0])])
+
+    monkeypatch.setattr(semantic_cache.client.embeddings, 'create', create)
+
+    assert asyncio.run(semantic_cache.cached_query_embedding('query')) is None
+    embedding = asyncio.run(semantic_cache.embed_query('query'))
+
+    np.testing.assert_allclose(embedding, [0.6, 0.8])
+    assert calls[0]['input'] == ['query']
+    cached = asyncio.run(semantic_cache.cached_query_embedding('query'))
+    np.testing.assert_array_equal(cached, embedding)
+
+
+def test_embed_query_returns_none_when_the_api_fails(embedding_cache, monkeypatch):
+    async def create(**kwargs):
+        raise openai.APITimeoutError(
+            request=httpx.Request('POST', 'https://api.openai.com/v1/embeddings')
+        )
+
+    monkeypatch.setattr(semantic_cache.client.embeddings, 'create', create)
+
+    assert asyncio.run(semantic_cache.embed_query('query')) is None
+    assert asyncio.run(semantic_cache.cached_query_embedding('query')) is None
@@ -86,6 +86,14 @@ const typingEffect = (text, textElement, botMsgDiv, onComplete) => {
   }, 40);
 };
 
+/**
+ * Builds a data URL for a base64 encoded image, detecting JPEG by its signature.
+ * @param {string} imageData - Base64 encoded PNG or JPEG image.
+ * @returns {string} Data URL of the image.
+ */
+const imageDataUrl = (imageData) =>
+  `data:image/${imageData.startsWith("/9j/") ? "jpeg" : "png"};base64,${imageData}`;
+
 /**
  * Opens a modal to view images with zoom capability.
  * @param {string} imageData - Base64 encoded image.
@@ -95,7 +103,7 @@ const openImageViewer = (imageData) => {
   modal.className = "image-viewer-modal";
 
   const img = document.createElement("img");
-  img.src = `data:image/png;base64,${imageData}`;
+  img.src = imageDataUrl(imageData);
   img.className = "zooming-image";
 
   modal.appendChild(img);
@@ -116,6 +124,77 @@ const openImageViewer = (imageData) => {
   });
 };
 
+/**
+ * Reads the Server-Sent Events stream returned by the RAG endpoints.
+ * Answer tokens are shown in the text element as they arrive.
+ * @param {Response} response - The fetch response with an event-stream body.
+ * @param {HTMLElement} textElement - Element to display the streamed text.
+ * @returns {Promise<object>} The terminating payload with the cleaned answer and highlighted images.
+ * @throws Will throw an error if the stream ends without a terminating payload.
+ */
+const readRAGStream = async (response, textElement) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder("utf-8");
+  let buffer = "";
+  let streamedText = "";
+  let finalPayload = null;
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Frames are separated by a blank line; keep any incomplete frame in the buffer.
+    const frames = buffer.split("\n\n");
+    buffer = frames.pop();
+    for (const frame of frames) {
+      if (!frame.startsWith("data: ")) continue;
+      const payload = JSON.parse(frame.slice("data: ".length));
+      if (payload.type === "token") {
+        streamedText += payload.content;
+        textElement.textContent = streamedText;
+        scrollToBottom();
+      } else if (payload.type === "done") {
+        finalPayload = payload;
+      }
+    }
+  }
+
+  if (!finalPayload) {
+    throw new Error("The response ended unexpectedly.");
+  }
+  return finalPayload;
+};
+
+/**
+ * Renders the final RAG answer as markdown and attaches the highlighted images.
+ * @param {string} answer - Answer text without the keywords section.
+ * @param {string[]} highlightedImages - Base64 encoded highlighted images.
+ * @param {HTMLElement} textElement - Element to display the answer.
+ * @param {HTMLElement} botMsgDiv - Bot message container.
+ */
+const renderRAGAnswer = (answer, highlightedImages, textElement, botMsgDiv) => {
+  textElement.innerHTML = DOMPurify.sanitize(marked.parse(answer));
+  hljs.highlightAll();
+  botMsgDiv.classList.remove("loading");
+  document.body.classList.remove("bot-responding");
+
+  highlightedImages?.forEach((imgData) => {
+    const imgWrapper = document.createElement("div");
+    imgWrapper.className = "image-attachment";
+
+    const img = document.createElement("img");
+    img.src = imageDataUrl(imgData);
+    img.alt = "Highlighted section";
+    img.className = "highlighted-image-thumbnail";
+
+    img.addEventListener("click", () => openImageViewer(imgData));
+    imgWrapper.appendChild(img);
+    botMsgDiv.appendChild(imgWrapper);
+  });
+  scrollToBottom();
+};
+
 /**
  * Generates a bot response by sending the chat history to the API.
  * Streams the response and displays it with a typing effect.
@@ -209,30 +288,15 @@ const generateCustomPdfRAGResponse = async (botMsgDiv) => {
       throw new Error(`Server error: ${response.status}`);
     }
 
-    // Process the JSON response containing the answer.
-    const data = await response.json();
+    // Stream the answer, then render it once the final payload arrives.
+    textElement.textContent = "";
+    const data = await readRAGStream(response, textElement);
     const { answer, highlighted_images } = data;
     chatHistory.push({
       role: "assistant",
       content: answer,
     });
-    typingEffect(answer, textElement, botMsgDiv, () => {
-      if (highlighted_images?.length) {
-        highlighted_images.forEach((imgData) => {
-          const imgWrapper = document.createElement("div");
-          imgWrapper.className = "image-attachment";
-
-          const img = document.createElement("img");
-          img.src = `data:image/png;base64,${imgData}`;
-          img.alt = "Highlighted section";
-          img.className = "highlighted-image-thumbnail";
-
-          img.addEventListener("click", () => openImageViewer(imgData));
-          imgWrapper.appendChild(img);
-          botMsgDiv.appendChild(imgWrapper);
-        });
-      }
-    });
+    renderRAGAnswer(answer, highlighted_images, textElement, botMsgDiv);
   } catch (error) {
     if (error.name === "AbortError") {
       textElement.textContent = "Response generation stopped.";
@@ -274,29 +338,14 @@ const generateReportRAGResponse = async (botMsgDiv) => {
       throw new Error(`Server error: ${response.status}`);
     }
 
-    const data = await response.json();
+    textElement.textContent = "";
+    const data = await readRAGStream(response, textElement);
     const { answer, highlighted_images } = data;
     chatHistory.push({
       role: "assistant",
       content: answer,
     });
-    typingEffect(answer, textElement, botMsgDiv, () => {
-      if (highlighted_images?.length) {
-        highlighted_images.forEach((imgData) => {
-          const imgWrapper = document.createElement("div");
-          imgWrapper.className = "image-attachment";
-
-          const img = document.createElement("img");
-          img.src = `data:image/png;base64,${imgData}`;
-          img.alt = "Highlighted section";
-          img.className = "highlighted-image-thumbnail";
-
-          img.addEventListener("click", () => openImageViewer(imgData));
-          imgWrapper.appendChild(img);
-          botMsgDiv.appendChild(imgWrapper);
-        });
-      }
-    });
+    renderRAGAnswer(answer, highlighted_images, textElement, botMsgDiv);
   } catch (error) {
     if (error.name === "AbortError") {
       textElement.textContent = "Response generation stopped.";